@@ -15,20 +15,23 @@ Data: 2024
 
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # Backend sem janela: o script só salva PNGs
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
+from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
 
+from joblib import Parallel, delayed
+
 from data_wrangling.dw_historico import processar_historico_estoque
 from sarima_estoque import PrevisorEstoqueSARIMA
 
 
-def identificar_melhor_sku(df):
+def ranking_skus(df):
     """
-    Identifica o SKU com mais observações e maior variabilidade.
-    
-    Usa uma métrica combinada: número de observações * coeficiente de variação
+    Calcula estatísticas e score por SKU (observações x variabilidade x média).
     
     Parameters:
     -----------
@@ -37,17 +40,12 @@ def identificar_melhor_sku(df):
         
     Returns:
     --------
-    str
-        SKU selecionado
-    dict
-        Estatísticas do SKU
+    pd.DataFrame
+        Estatísticas por SKU com colunas 'cv' e 'score' (sem ordenação;
+        use indices_top_score para obter os melhores)
     """
-    print("\n" + "=" * 70)
-    print("Identificando melhor SKU para teste...")
-    print("=" * 70)
-    
-    # Calcula estatísticas por SKU
-    stats = df.groupby('sku')['estoque_atual'].agg([
+    # Calcula estatísticas por SKU (um único agrupamento)
+    stats = df.groupby('sku', sort=False)['estoque_atual'].agg([
         'count',
         'mean',
         'std',
@@ -57,44 +55,98 @@ def identificar_melhor_sku(df):
     
     # Filtra SKUs com média muito baixa (menos de 1 unidade em média)
     # SKUs com estoque quase sempre zero não são bons para SARIMA
-    stats = stats[stats['mean'] >= 1.0].copy()
-    
-    if len(stats) == 0:
-        # Se nenhum SKU atende o critério, relaxa para média >= 0.5
-        stats = df.groupby('sku')['estoque_atual'].agg([
-            'count', 'mean', 'std', 'min', 'max'
-        ]).reset_index()
-        stats = stats[stats['mean'] >= 0.5].copy()
+    media = stats['mean'].to_numpy()
+    filtro = media >= 1.0
+    if not filtro.any():
+        # Se nenhum SKU atende o critério, relaxa para média >= 0.5 (sem reagrupar)
+        filtro = media >= 0.5
+    stats = stats[filtro].reset_index(drop=True)
     
     # Coeficiente de variação (desvio padrão / média)
-    stats['cv'] = stats['std'] / stats['mean']
-    stats['cv'] = stats['cv'].fillna(0)
+    media = stats['mean'].to_numpy()
+    cv = np.nan_to_num(stats['std'].to_numpy() / media, nan=0.0)
+    stats['cv'] = cv
     
     # Score combinado: observações * coeficiente de variação * média
     # Isso favorece SKUs com muitas observações, alta variabilidade E estoque significativo
-    stats['score'] = stats['count'] * stats['cv'] * stats['mean']
+    stats['score'] = stats['count'].to_numpy() * cv * media
     
-    # Ordena por score
-    stats = stats.sort_values('score', ascending=False)
+    return stats
+
+
+def indices_top_score(stats, k):
+    """
+    Posições das k linhas de maior score, em ordem decrescente.
     
-    # SKU selecionado
-    sku_selecionado = stats.iloc[0]['sku']
+    Usa np.argpartition (O(N)) e ordena apenas os k selecionados.
+    """
+    scores = stats['score'].to_numpy()
+    k = min(k, len(scores))
+    if k == 0:
+        return np.array([], dtype=int)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def identificar_melhor_sku(df):
+    """
+    Identifica o SKU com mais observações e maior variabilidade.
+    
+    Usa uma métrica combinada: número de observações * coeficiente de variação
+    
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        DataFrame processado com dados de estoque
+        
+    Returns:
+    --------
+    str
+        SKU selecionado
+    dict
+        Estatísticas do SKU
+    """
+    print("\n" + "=" * 70)
+    print("Identificando melhor SKU para teste...")
+    print("=" * 70)
+    
+    stats = ranking_skus(df)
+    
+    # SKU selecionado (argmax do score, sem ordenar a tabela inteira)
+    melhor = stats.iloc[int(stats['score'].to_numpy().argmax())]
+    sku_selecionado = melhor['sku']
     
     print(f"\n[OK] SKU Selecionado: {sku_selecionado}")
     print(f"\nEstatisticas do SKU:")
-    print(f"   - Observacoes: {int(stats.iloc[0]['count'])}")
-    print(f"   - Media de estoque: {stats.iloc[0]['mean']:.2f}")
-    print(f"   - Desvio padrao: {stats.iloc[0]['std']:.2f}")
-    print(f"   - Coeficiente de variacao: {stats.iloc[0]['cv']:.3f}")
-    print(f"   - Minimo: {stats.iloc[0]['min']:.0f}")
-    print(f"   - Maximo: {stats.iloc[0]['max']:.0f}")
-    print(f"   - Score: {stats.iloc[0]['score']:.2f}")
+    print(f"   - Observacoes: {int(melhor['count'])}")
+    print(f"   - Media de estoque: {melhor['mean']:.2f}")
+    print(f"   - Desvio padrao: {melhor['std']:.2f}")
+    print(f"   - Coeficiente de variacao: {melhor['cv']:.3f}")
+    print(f"   - Minimo: {melhor['min']:.0f}")
+    print(f"   - Maximo: {melhor['max']:.0f}")
+    print(f"   - Score: {melhor['score']:.2f}")
     
     # Mostra top 5
     print(f"\nTop 5 SKUs por score (observacoes x variabilidade):")
-    print(stats.head(5)[['sku', 'count', 'cv', 'score']].to_string(index=False))
+    top5 = stats.iloc[indices_top_score(stats, 5)]
+    print(top5[['sku', 'count', 'cv', 'score']].to_string(index=False))
     
-    return sku_selecionado, stats.iloc[0].to_dict()
+    return sku_selecionado, melhor.to_dict()
+
+
+# Figura reaproveitada entre chamadas de visualizar_resultado (criada sob demanda)
+_FIG = None
+_AX = None
+
+
+def _obter_eixo():
+    """Retorna (fig, ax) da figura compartilhada, limpando o conteúdo anterior."""
+    global _FIG, _AX
+    if _FIG is None:
+        _FIG, _AX = plt.subplots(figsize=(14, 8))
+    else:
+        _AX.clear()
+    return _FIG, _AX
 
 
 def visualizar_resultado(serie_historica, previsao, sku, stats):
@@ -112,46 +164,44 @@ def visualizar_resultado(serie_historica, previsao, sku, stats):
     stats : dict
         Estatísticas do modelo
     """
-    plt.figure(figsize=(14, 8))
+    fig, ax = _obter_eixo()
     
     # Plot histórico (últimos 90 dias para melhor visualização)
     serie_plot = serie_historica.iloc[-90:] if len(serie_historica) > 90 else serie_historica
     
-    plt.plot(serie_plot.index, serie_plot.values, 
-             label='Histórico Real', color='#2E86AB', linewidth=2, alpha=0.8)
+    # rasterized: a linha vira bitmap no savefig em vez de centenas de segmentos vetoriais
+    ax.plot(serie_plot.index, serie_plot.values, 
+            label='Histórico Real', color='#2E86AB', linewidth=2, alpha=0.8, rasterized=True)
     
     # Plot previsão
-    plt.plot(previsao.index, previsao.values, 
-             label='Previsão (Próximo Mês)', color='#A23B72', linewidth=2.5, 
-             linestyle='--', marker='o', markersize=4)
+    ax.plot(previsao.index, previsao.values, 
+            label='Previsão (Próximo Mês)', color='#A23B72', linewidth=2.5, 
+            linestyle='--', marker='o', markersize=4, rasterized=True)
     
     # Linha divisória
     ultima_data = serie_historica.index[-1]
-    plt.axvline(x=ultima_data, color='gray', linestyle=':', alpha=0.7, linewidth=2)
-    plt.text(ultima_data, plt.ylim()[1] * 0.95, 'Fim do\nHistórico', 
-             ha='center', va='top', fontsize=9, bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
+    ax.axvline(x=ultima_data, color='gray', linestyle=':', alpha=0.7, linewidth=2)
+    ax.text(ultima_data, ax.get_ylim()[1] * 0.95, 'Fim do\nHistórico', 
+            ha='center', va='top', fontsize=9, bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
     
     # Configurações do gráfico
-    plt.title(f'Previsão de Estoque - SKU: {sku}\nSARIMA ({stats.get("modelo", "N/A")})', 
-              fontsize=16, fontweight='bold', pad=20)
-    plt.xlabel('Data', fontsize=12)
-    plt.ylabel('Estoque (unidades)', fontsize=12)
-    plt.legend(loc='best', fontsize=11, framealpha=0.9)
-    plt.grid(True, alpha=0.3, linestyle='--')
+    ax.set_title(f'Previsão de Estoque - SKU: {sku}\nSARIMA ({stats.get("modelo", "N/A")})', 
+                 fontsize=16, fontweight='bold', pad=20)
+    ax.set_xlabel('Data', fontsize=12)
+    ax.set_ylabel('Estoque (unidades)', fontsize=12)
+    ax.legend(loc='best', fontsize=11, framealpha=0.9)
+    ax.grid(True, alpha=0.3, linestyle='--')
     
     # Formata eixo X
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
     
     # Salva gráfico (TCC Fig 7 – formato SARIMA único)
-    from pathlib import Path
     dir_fig = Path('resultados/figuras_modelos')
     dir_fig.mkdir(parents=True, exist_ok=True)
     nome_arquivo = dir_fig / f'previsao_sarima_{sku}.png'
-    plt.savefig(nome_arquivo, dpi=300, bbox_inches='tight')
+    fig.savefig(nome_arquivo, dpi=300, bbox_inches='tight', pil_kwargs={'optimize': True})
     print(f"\n[OK] Grafico salvo: {nome_arquivo}")
-    
-    plt.close()
 
 
 def calcular_estatisticas_previsao(serie_historica, previsao):
@@ -170,47 +220,97 @@ def calcular_estatisticas_previsao(serie_historica, previsao):
     dict
         Estatísticas
     """
+    # Reduções direto no array NumPy (sem o overhead de cada chamada pandas)
+    valores = previsao.to_numpy(dtype=float)
+    previsao_media = valores.mean()
+    estoque_atual = serie_historica.iloc[-1]
+    
     stats = {
-        'previsao_media': previsao.mean(),
-        'previsao_min': previsao.min(),
-        'previsao_max': previsao.max(),
-        'previsao_total': previsao.sum(),
-        'estoque_atual': serie_historica.iloc[-1],
-        'variacao_percentual': ((previsao.mean() - serie_historica.iloc[-1]) / serie_historica.iloc[-1] * 100) if serie_historica.iloc[-1] > 0 else 0
+        'previsao_media': previsao_media,
+        'previsao_min': valores.min(),
+        'previsao_max': valores.max(),
+        'previsao_total': valores.sum(),
+        'estoque_atual': estoque_atual,
+        'variacao_percentual': ((previsao_media - estoque_atual) / estoque_atual * 100) if estoque_atual > 0 else 0
     }
     
     return stats
 
 
-def teste_completo():
-    """
-    Executa teste completo: processa dados, seleciona SKU, treina SARIMA e prevê.
+# Histórico processado: CSV gerado pelo data wrangling e cache Parquet equivalente
+CAMINHO_PROCESSADO_CSV = Path('DB/historico_estoque_atual_processado.csv')
+CAMINHO_PROCESSADO_PARQUET = CAMINHO_PROCESSADO_CSV.with_suffix('.parquet')
+COLUNAS_PROCESSADO = ['sku', 'data', 'estoque_atual']
+
+
+def _salvar_cache_processado(df_processado):
+    """Grava o histórico processado em Parquet (lido nas próximas execuções)."""
+    try:
+        df_processado[COLUNAS_PROCESSADO].to_parquet(CAMINHO_PROCESSADO_PARQUET, compression='zstd')
+    except (ImportError, OSError, ValueError, TypeError) as e:
+        # Cache é só otimização: falhas de conversão do pyarrow (ArrowInvalid/
+        # ArrowTypeError são ValueError/TypeError) não interrompem a execução
+        print(f"   [AVISO] Cache Parquet nao gravado: {e}")
+
+
+def carregar_dados_processados():
     """
-    print("=" * 70)
-    print("TESTE SARIMA: Previsao de Demanda para Proximo Mes")
-    print("=" * 70)
+    Carrega o histórico de estoque processado (ou processa o arquivo atualizado
+    se ainda não existir).
     
-    # 1. Processar dados (ou carregar se já processados)
-    print("\nPASSO 1: Processando dados historicos...")
-    # Usa arquivo atualizado
-    try:
-        # Tenta carregar dados já processados do arquivo atualizado
-        df_processado = pd.read_csv('DB/historico_estoque_atual_processado.csv')
-        df_processado['data'] = pd.to_datetime(df_processado['data'])
+    Prefere o cache Parquet (datas já tipadas, só as colunas usadas) enquanto
+    ele for mais recente que o CSV processado.
+    
+    Returns:
+    --------
+    pd.DataFrame
+        DataFrame com colunas 'sku', 'data', 'estoque_atual'
+    """
+    if CAMINHO_PROCESSADO_PARQUET.exists() and (
+        not CAMINHO_PROCESSADO_CSV.exists()
+        or CAMINHO_PROCESSADO_PARQUET.stat().st_mtime >= CAMINHO_PROCESSADO_CSV.stat().st_mtime
+    ):
+        df_processado = pd.read_parquet(CAMINHO_PROCESSADO_PARQUET, columns=COLUNAS_PROCESSADO)
+        print("   [CACHE] Dados processados carregados do Parquet")
+    elif CAMINHO_PROCESSADO_CSV.exists():
+        # Carrega dados já processados do arquivo atualizado
+        # Datas do CSV processado são 'AAAA-MM-DD': formato explícito, parse na leitura
+        df_processado = pd.read_csv(
+            CAMINHO_PROCESSADO_CSV,
+            parse_dates=['data'],
+            date_format='%Y-%m-%d'
+        )
         print("   [OK] Dados processados (atualizados) encontrados! Carregando...")
-    except FileNotFoundError:
+        _salvar_cache_processado(df_processado)
+    else:
         # Se não existir, processa arquivo atualizado
         print("   [AVISO] Dados processados nao encontrados. Processando arquivo atualizado...")
         df_processado = processar_historico_estoque(
             caminho_entrada='DB/historico_estoque_atual.csv',
-            caminho_saida='DB/historico_estoque_atual_processado.csv',
+            caminho_saida=str(CAMINHO_PROCESSADO_CSV),
             min_observacoes=30,
             criar_serie_completa=True
         )
+        _salvar_cache_processado(df_processado)
     
     print(f"   [OK] {len(df_processado):,} registros carregados")
     print(f"   [OK] {df_processado['sku'].nunique()} SKUs disponiveis")
     
+    return df_processado
+
+
+def teste_completo():
+    """
+    Executa teste completo: processa dados, seleciona SKU, treina SARIMA e prevê.
+    """
+    print("=" * 70)
+    print("TESTE SARIMA: Previsao de Demanda para Proximo Mes")
+    print("=" * 70)
+    
+    # 1. Processar dados (ou carregar se já processados)
+    print("\nPASSO 1: Processando dados historicos...")
+    df_processado = carregar_dados_processados()
+    
     # 2. Identificar melhor SKU
     sku_selecionado, stats_sku = identificar_melhor_sku(df_processado)
     
@@ -306,6 +406,85 @@ def teste_completo():
     print("\n" + "=" * 70)
 
 
+def _treinar_e_prever_sku(df_sku, sku, horizonte=30):
+    """
+    Treina SARIMA e gera previsão para um único SKU (executado em processo separado).
+    
+    Parameters:
+    -----------
+    df_sku : pd.DataFrame
+        Linhas do DataFrame processado referentes apenas a este SKU
+    sku : str
+        Código do SKU
+    horizonte : int
+        Horizonte de previsão em dias
+        
+    Returns:
+    --------
+    dict
+        Resultado do SKU (modelo e estatísticas da previsão) ou erro
+    """
+    previsor = PrevisorEstoqueSARIMA(horizonte_previsao=horizonte, frequencia='D')
+    serie = previsor.preparar_serie_temporal(df_sku, sku=sku)
+    
+    modelo = previsor.treinar_modelo(serie, sku=sku)
+    if modelo is None:
+        return {'sku': sku, 'erro': 'falha ao treinar modelo'}
+    
+    previsao = previsor.prever(serie, modelo=modelo)
+    if previsao is None:
+        return {'sku': sku, 'erro': 'falha ao gerar previsao'}
+    
+    resultado = {'sku': sku, 'modelo': f"{modelo.order} x {modelo.seasonal_order}"}
+    resultado.update(calcular_estatisticas_previsao(serie, previsao))
+    return resultado
+
+
+def teste_completo_topk(k=8, n_jobs=-1):
+    """
+    Treina SARIMA em paralelo para os K SKUs de maior score.
+    
+    Cada ajuste é independente e limitado por CPU, então roda em processos
+    separados (backend 'loky' do joblib) para não ficar preso ao GIL.
+    
+    Parameters:
+    -----------
+    k : int
+        Número de SKUs (top K por score)
+    n_jobs : int
+        Número de processos (-1 = todos os cores)
+        
+    Returns:
+    --------
+    pd.DataFrame
+        Uma linha por SKU com modelo e estatísticas da previsão
+    """
+    print("=" * 70)
+    print(f"TESTE SARIMA: Top {k} SKUs em paralelo")
+    print("=" * 70)
+    
+    print("\nPASSO 1: Processando dados historicos...")
+    df_processado = carregar_dados_processados()
+    
+    stats = ranking_skus(df_processado)
+    skus = stats.iloc[indices_top_score(stats, k)]['sku'].tolist()
+    print(f"\nPASSO 2: Treinando {len(skus)} modelos SARIMA (n_jobs={n_jobs})...")
+    
+    # Envia a cada processo apenas as linhas do seu SKU
+    grupos = dict(tuple(df_processado[df_processado['sku'].isin(skus)].groupby('sku')))
+    resultados = Parallel(n_jobs=n_jobs, backend='loky')(
+        delayed(_treinar_e_prever_sku)(grupos[sku], sku) for sku in skus
+    )
+    
+    df_resultados = pd.DataFrame(resultados)
+    print("\n" + "=" * 70)
+    print("RESULTADOS")
+    print("=" * 70)
+    print(df_resultados.to_string(index=False))
+    
+    return df_resultados
+
+
 if __name__ == "__main__":
     try:
         teste_completo()
@@ -0,0 +1,63 @@
+"""
+Configuração compartilhada dos scripts de organização do repositório
+(organizar_arquivos.py e organizar_repositorio.py)
+
+Uma única fonte para o mapeamento arquivo -> pasta, evitando que os dois
+scripts divirjam e movam o mesmo arquivo para pastas diferentes.
+"""
+
+# Mapeamento de arquivos para pastas
+MAPEAMENTO = {
+    'analises': (
+        'analise_exploratoria_sazonalidade.py',
+        'analise_box_jenkins_sarima.py',
+        'analise_sazonalidade_padroes.png',
+        'relatorio_analise_sazonalidade.txt',
+        'README_ANALISE_EXPLORATORIA.md',
+        'ANALISE_BOX_JENKINS.md',
+        'CHECKLIST_BOX_JENKINS.md',
+    ),
+    'modelos': (
+        'comparacao_modelos_previsao.py',
+        'comparacao_top_skus.py',
+        'comparacao_top_skus_otimizado.py',
+        'README_COMPARACAO_MODELOS.md',
+        'resultados_comparacao',  # pasta de saídas da comparação
+    ),
+    'validacao': (
+        'validacao_walk_forward_sarima.py',
+        'teste_tempo_processamento.py',
+        'tratamento_outliers_sarima.py',
+    ),
+    'previsoes': (
+        'teste_sarima_produto.py',
+    ),
+    'documentacao': (
+        'README_SARIMA.md',
+        'GUIA_RAPIDO.md',
+        'GUIA_RAPIDO_EXPLICACAO_FERRAMENTAS.md',
+        'EXPLICACAO_RESULTADOS_SARIMA.md',
+        'DOCUMENTACAO_TECNICA_FERRAMENTAS.md',
+        'explicacao_ferramentas_sarima.pdf',
+        'ORGANIZACAO_REPOSITORIO.md',
+        'RESUMO_MELHORIAS.md',
+        'README_OTIMIZACAO.md',
+    ),
+    'exemplos': (
+        'exemplo_uso_sarima.py',
+        'exemplo_elencacao_completa.py',
+    ),
+}
+
+# Padrões glob (arquivos com wildcards)
+PADROES = {
+    'modelos': ('comparacao_modelos_*.png', 'relatorio_comparacao_*.txt'),
+    'previsoes': ('previsao_sarima_*.png',),
+}
+
+# Mapa reverso arquivo -> pasta, montado uma vez na importação
+ARQUIVO_PARA_PASTA = {
+    arquivo: pasta
+    for pasta, arquivos in MAPEAMENTO.items()
+    for arquivo in arquivos
+}
@@ -18,6 +18,76 @@ SCRIPTS_ATUALIZAR = [
     'exemplos/exemplo_uso_sarima.py',
 ]
 
+# Padrões para substituir (padrão, substituição)
+PADROES = [
+    # plt.savefig('arquivo.png')
+    (r"plt\.savefig\(['\"](\w+\.png)['\"]", r"plt.savefig('resultados/\1'"),
+    # plt.savefig("arquivo.png")
+    (r'plt\.savefig\(["\']([^"\']+\.png)["\']', lambda m: f"plt.savefig('resultados/{Path(m.group(1)).name}'"),
+    # to_csv('arquivo.csv')
+    (r"\.to_csv\(['\"](\w+\.csv)['\"]", r".to_csv('resultados/\1'"),
+    # nome_arquivo = 'arquivo.png'
+    (r"nome_arquivo\s*=\s*['\"](\w+\.(png|csv|txt))['\"]", r"nome_arquivo = 'resultados/\1'"),
+    # caminho_saida = 'arquivo.csv'
+    (r"caminho_saida\s*=\s*['\"](\w+\.(png|csv|txt))['\"]", r"caminho_saida = 'resultados/\1'"),
+]
+
+# Trechos inseridos quando o script salva arquivos e ainda não cria a pasta
+IMPORT_PATH = 'from pathlib import Path'
+CRIAR_PASTA = 'Path("resultados").mkdir(exist_ok=True)'
+
+# Tokens que precisam aparecer no arquivo para haver alguma alteração
+TOKENS_CANDIDATOS = ('savefig', 'to_csv', 'nome_arquivo', 'caminho_saida')
+
+# Compilados uma vez: cada padrão isolado (para aplicar a substituição com os
+# grupos originais) e uma única alternação nomeada com os padrões de caminho,
+# o primeiro import (onde entra IMPORT_PATH) e o primeiro ponto de salvamento
+# (onde entra CRIAR_PASTA) -- o arquivo inteiro é reescrito em uma só varredura
+_PADROES_COMPILADOS = [(re.compile(p), sub) for p, sub in PADROES]
+_IDX_IMPORT = len(PADROES)
+_IDX_SALVAR = len(PADROES) + 1
+_ALTERNACAO = re.compile('|'.join(
+    [f'(?P<p{i}>{p})' for i, (p, _) in enumerate(PADROES)]
+    + [rf'(?P<p{_IDX_IMPORT}>import\s+\w+\s*\n)',
+       rf'(?P<p{_IDX_SALVAR}>plt\.savefig|\.to_csv)']
+))
+# Padrões que começam em plt.savefig / .to_csv (pontos de salvamento)
+_IDX_PONTOS_SALVAR = {0, 1, 2, _IDX_SALVAR}
+
+
+def _reescrever(conteudo):
+    """Aplica padrões de caminho e insere import/criação de pasta em uma passada."""
+    precisa_pasta = CRIAR_PASTA not in conteudo and ('savefig' in conteudo or 'to_csv' in conteudo)
+    pendente = {
+        'import': precisa_pasta and IMPORT_PATH not in conteudo,
+        'pasta': precisa_pasta,
+    }
+    
+    def _substituir(m):
+        i = int(m.lastgroup[1:])
+        texto = m.group(0)
+        if i == _IDX_IMPORT:
+            if pendente['import']:
+                pendente['import'] = False
+                return f"{texto}{IMPORT_PATH}\n"
+            return texto
+        
+        if i < len(PADROES):
+            padrao, substituicao = _PADROES_COMPILADOS[i]
+            m_original = padrao.match(texto)
+            if callable(substituicao):
+                texto = substituicao(m_original)
+            else:
+                texto = m_original.expand(substituicao)
+        
+        if i in _IDX_PONTOS_SALVAR and pendente['pasta']:
+            pendente['pasta'] = False
+            texto = f"{CRIAR_PASTA}\n    {texto}"
+        return texto
+    
+    return _ALTERNACAO.sub(_substituir, conteudo)
+
+
 def atualizar_caminho_arquivo(caminho_script):
     """Atualiza caminhos de saída em um script"""
     if not Path(caminho_script).exists():
@@ -26,56 +96,15 @@ def atualizar_caminho_arquivo(caminho_script):
     with open(caminho_script, 'r', encoding='utf-8') as f:
         conteudo = f.read()
     
-    conteudo_original = conteudo
-    mudancas = 0
-    
-    # Padrões para substituir
-    padroes = [
-        # plt.savefig('arquivo.png')
-        (r"plt\.savefig\(['\"](\w+\.png)['\"]", r"plt.savefig('resultados/\1'"),
-        # plt.savefig("arquivo.png")
-        (r'plt\.savefig\(["\']([^"\']+\.png)["\']', lambda m: f"plt.savefig('resultados/{Path(m.group(1)).name}'"),
-        # to_csv('arquivo.csv')
-        (r"\.to_csv\(['\"](\w+\.csv)['\"]", r".to_csv('resultados/\1'"),
-        # nome_arquivo = 'arquivo.png'
-        (r"nome_arquivo\s*=\s*['\"](\w+\.(png|csv|txt))['\"]", r"nome_arquivo = 'resultados/\1'"),
-        # caminho_saida = 'arquivo.csv'
-        (r"caminho_saida\s*=\s*['\"](\w+\.(png|csv|txt))['\"]", r"caminho_saida = 'resultados/\1'"),
-    ]
-    
-    # Para cada padrão
-    for padrao, substituicao in padroes:
-        if callable(substituicao):
-            conteudo = re.sub(padrao, substituicao, conteudo)
-        else:
-            novo_conteudo = re.sub(padrao, substituicao, conteudo)
-            if novo_conteudo != conteudo:
-                mudancas += 1
-                conteudo = novo_conteudo
+    # Sondagem barata: sem nenhum token candidato, não há o que reescrever
+    if not any(token in conteudo for token in TOKENS_CANDIDATOS):
+        return False
     
-    # Adiciona criação da pasta resultados/ no início das funções principais
-    if 'Path("resultados").mkdir(exist_ok=True)' not in conteudo and ('savefig' in conteudo or 'to_csv' in conteudo):
-        # Adiciona import e criação de pasta no início do arquivo ou função
-        if 'from pathlib import Path' not in conteudo:
-            # Adiciona após imports
-            conteudo = re.sub(
-                r'(import\s+\w+\s*\n)',
-                r'\1from pathlib import Path\n',
-                conteudo,
-                count=1
-            )
-        
-        # Adiciona criação de pasta antes de salvar
-        conteudo = re.sub(
-            r'(plt\.savefig|\.to_csv)',
-            r'Path("resultados").mkdir(exist_ok=True)\n    \1',
-            conteudo,
-            count=1
-        )
+    conteudo_novo = _reescrever(conteudo)
     
-    if conteudo != conteudo_original:
+    if conteudo_novo != conteudo:
         with open(caminho_script, 'w', encoding='utf-8') as f:
-            f.write(conteudo)
+            f.write(conteudo_novo)
         return True
     
     return False
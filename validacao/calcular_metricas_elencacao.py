@@ -12,33 +12,205 @@ import numpy as np
 from pathlib import Path
 from datetime import datetime
 
+# Timestamps exportados do banco seguem ISO 8601 (com ou sem fração de segundos)
+FORMATO_DATA = 'ISO8601'
+
+DTYPES_VENDAS = {
+    'sku': 'string',
+    'quantidade': 'float32',
+    'valor_unitario': 'float32',
+    'custo_unitario': 'float32',
+    'margem_proporcional': 'float32',
+}
+
+DTYPES_ESTOQUE = {
+    'sku': 'string',
+    'saldo': 'float32',
+}
+
+# Tentar importar numba para o kernel de U(t) (opcional)
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    # Sem fastmath: o kernel escreve np.inf e pode receber saldo NaN (células
+    # inválidas coagidas), e precisa dar o mesmo resultado do np.where.
+    # Serial: com algumas centenas de SKUs, o pool de threads custaria mais
+    @njit(cache=True)
+    def _urgencia_kernel(saldo, venda_media, out):
+        for i in range(saldo.shape[0]):
+            v = venda_media[i]
+            out[i] = saldo[i] / v if v > 0 else np.inf
+
+
+def _calcular_urgencia(saldo, venda_media):
+    """U(t) = saldo / venda média diária, com np.inf quando não há vendas."""
+    if NUMBA_AVAILABLE:
+        out = np.empty(saldo.shape[0], dtype=np.float32)
+        _urgencia_kernel(saldo, venda_media, out)
+        return out
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(venda_media > 0, saldo / venda_media, np.inf).astype(np.float32)
+
+
+# Linhas por bloco na leitura em streaming do CSV
+TAMANHO_BLOCO = 500_000
+
+
+def _cache_tem_colunas(cache, colunas):
+    """Verifica (só pelo schema, sem ler dados) se o Parquet tem as colunas."""
+    try:
+        import pyarrow.parquet as pq
+        return set(colunas) <= set(pq.read_schema(cache).names)
+    except (ImportError, OSError):
+        return False
+
+
+def _coagir_tipos(df, dtype):
+    """
+    Converte para os tipos de `dtype` (e 'created_at' para datetime) as colunas
+    que o parser não tipou: valores inválidos viram NaN/NaT, como no
+    pd.to_numeric/pd.to_datetime(errors='coerce').
+    """
+    for coluna, tipo in dtype.items():
+        if pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(tipo)) and df[coluna].dtype != tipo:
+            df[coluna] = pd.to_numeric(df[coluna], errors='coerce').astype(tipo)
+    if not pd.api.types.is_datetime64_any_dtype(df['created_at']):
+        df['created_at'] = pd.to_datetime(df['created_at'], format=FORMATO_DATA, errors='coerce')
+    return df
+
+
+def _ler_csv(caminho, dtype, reduzir_bloco=None, coagir=False):
+    """
+    Lê do CSV as colunas de `dtype` + 'created_at' já tipadas.
+    
+    Com coagir=True, as colunas numéricas são lidas sem tipo e convertidas
+    depois por _coagir_tipos (tolera células como 'N/D').
+    """
+    dtype_leitura = dtype
+    if coagir:
+        dtype_leitura = {
+            coluna: tipo for coluna, tipo in dtype.items()
+            if not pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(tipo))
+        }
+    kwargs_csv = dict(
+        usecols=[*dtype, 'created_at'],
+        dtype=dtype_leitura,
+        parse_dates=['created_at'],
+        date_format=FORMATO_DATA,
+    )
+    if reduzir_bloco is not None:
+        blocos = pd.read_csv(caminho, chunksize=TAMANHO_BLOCO, **kwargs_csv)
+        return reduzir_bloco(pd.concat([reduzir_bloco(_coagir_tipos(b, dtype)) for b in blocos]))
+    try:
+        df = pd.read_csv(caminho, engine='pyarrow', **kwargs_csv)
+    except (ImportError, ValueError):
+        # Sem pyarrow, ou erro de parse/conversão do pyarrow (ArrowInvalid é
+        # ValueError): tenta o parser C em blocos antes de desistir dos tipos
+        blocos = pd.read_csv(caminho, chunksize=TAMANHO_BLOCO, **kwargs_csv)
+        df = pd.concat(blocos, ignore_index=True)
+    return _coagir_tipos(df, dtype)
+
+
+def _ler_csv_com_cache(caminho, dtype, reduzir_bloco=None):
+    """
+    Lê do CSV apenas as colunas de `dtype` + 'created_at', reaproveitando um
+    cache Parquet gravado ao lado do arquivo original.
+    
+    O cache só é usado se for mais recente que o CSV e tiver todas as colunas
+    pedidas; caso contrário o CSV é relido (com dtypes e formato de data
+    explícitos) e o cache é regravado.
+    O CSV é lido pelo parser multi-thread do pyarrow; sem pyarrow (ou se ele
+    falhar no parse/conversão), usa o parser C em blocos. Se alguma célula não converter para o tipo pedido, o
+    CSV é relido sem tipos nas colunas numéricas e convertido com
+    errors='coerce' (valores inválidos viram NaN).
+    
+    Se `reduzir_bloco` for informado, o CSV é lido em blocos de TAMANHO_BLOCO
+    linhas e cada bloco é reduzido antes do próximo (pico de memória limitado
+    ao bloco); o resultado reduzido vai para um cache próprio, com o nome da
+    função no arquivo, para nunca ser lido como se fosse o CSV completo.
+    """
+    caminho = Path(caminho)
+    colunas = [*dtype, 'created_at']
+    if reduzir_bloco is None:
+        cache = caminho.with_suffix('.parquet')
+    else:
+        cache = caminho.with_name(f'{caminho.stem}_{reduzir_bloco.__name__.strip("_")}.parquet')
+    if (cache.exists() and cache.stat().st_mtime >= caminho.stat().st_mtime
+            and _cache_tem_colunas(cache, colunas)):
+        print(f"[CACHE] Lendo {cache}")
+        return pd.read_parquet(cache, columns=colunas)
+    
+    try:
+        df = _ler_csv(caminho, dtype, reduzir_bloco)
+    except ValueError as e:
+        print(f"[AVISO] {caminho}: valores fora do tipo esperado ({e}); convertendo com errors='coerce'")
+        df = _ler_csv(caminho, dtype, reduzir_bloco, coagir=True)
+    
+    try:
+        df.to_parquet(cache, engine='pyarrow', compression='zstd')
+    except (ImportError, OSError, ValueError, TypeError) as e:
+        # Cache é só otimização: falhas de conversão do pyarrow (ArrowInvalid/
+        # ArrowTypeError são ValueError/TypeError) não interrompem a execução
+        print(f"[AVISO] Cache Parquet nao gravado: {e}")
+    return df
+
+
+def _ultimo_registro_por_sku(df):
+    """Mantém apenas o registro mais recente (maior created_at) de cada SKU."""
+    df = df[df['sku'].notna() & df['created_at'].notna()]
+    idx_ultimo = df.groupby('sku', observed=True, sort=False)['created_at'].idxmax()
+    return df.loc[idx_ultimo]
+
+
 def carregar_dados_vendas(caminho="DB/venda_produtos_atual.csv"):
     """Carrega e prepara dados de vendas"""
     print(f"Carregando dados de vendas: {caminho}")
-    df = pd.read_csv(caminho, low_memory=False)
-    df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
-    df['quantidade'] = pd.to_numeric(df['quantidade'], errors='coerce')
-    df['margem_proporcional'] = pd.to_numeric(df['margem_proporcional'], errors='coerce')
-    df['valor_unitario'] = pd.to_numeric(df['valor_unitario'], errors='coerce')
-    df['custo_unitario'] = pd.to_numeric(df['custo_unitario'], errors='coerce')
+    df = _ler_csv_com_cache(caminho, DTYPES_VENDAS)
     df = df[df['sku'].notna()]
+    # sku categórico: a fatoração é feita uma vez e reaproveitada pelos groupbys
+    df['sku'] = df['sku'].astype('category')
     print(f"[OK] {len(df):,} registros carregados")
     return df
 
 
-def calcular_rentabilidade(df_vendas):
+def calcular_rentabilidade_e_venda_media(df_vendas, periodo_dias=365, gb=None):
     """
-    Calcula Rentabilidade R(t) = Média (Valor de Venda Unitário - Custo de Aquisição Unitário)
+    Calcula, com um único agrupamento por SKU, a Rentabilidade R(t) e a venda
+    média diária histórica (usada no Nível de Urgência U(t)).
     
-    Conforme tabela 2.2:
+    Rentabilidade, conforme tabela 2.2:
     - Propósito: Valor Financeiro. O retorno médio por unidade.
     - Dado de Origem: venda_produtos
     - Fórmula: R(t) = Média (Valor de Venda Unitário - Custo de Aquisição Unitário)
+    
+    Venda média diária: média, por SKU, da quantidade vendida em cada dia com
+    venda nos últimos `periodo_dias` dias.
+    
+    Parameters:
+    -----------
+    df_vendas : pd.DataFrame
+        Vendas com 'sku' categórico (ver carregar_dados_vendas)
+    periodo_dias : int
+        Janela da venda média diária
+    gb : DataFrameGroupBy, optional
+        Agrupamento por 'sku' já construído sobre df_vendas (reaproveitado)
+    
+    Returns:
+    --------
+    tuple(pd.DataFrame, pd.DataFrame)
+        (df_rentabilidade, df_venda_media), ambos com coluna 'sku'
     """
     print("\nCalculando Rentabilidade R(t)...")
     
-    # Agrega por SKU
-    df_agregado = df_vendas.groupby('sku').agg({
+    # Agrega por SKU (sort=False: mantém a ordem de aparição, sem ordenar as chaves)
+    if gb is None:
+        gb = df_vendas.groupby('sku', observed=True, sort=False)
+    df_agregado = gb.agg({
         'valor_unitario': 'mean',
         'custo_unitario': 'mean',
         'margem_proporcional': 'mean',  # Também calcula média da margem proporcional
@@ -56,32 +228,34 @@ def calcular_rentabilidade(df_vendas):
     print(f"[OK] Rentabilidade calculada para {len(df_agregado):,} SKUs")
     print(f"     Média geral: R$ {df_agregado['rentabilidade'].mean():.2f}")
     
-    return df_agregado[['sku', 'quantidade_vendida_total', 'margem_proporcional_media', 
-                        'rentabilidade', 'valor_unitario_medio', 'custo_unitario_medio']]
-
-
-def calcular_venda_media_diaria(df_vendas, periodo_dias=365):
-    """
-    Calcula venda média diária histórica por SKU.
-    Usado para calcular Nível de Urgência U(t).
-    """
-    print(f"\nCalculando venda media diaria (ultimos {periodo_dias} dias)...")
+    df_rentabilidade = df_agregado[['sku', 'quantidade_vendida_total', 'margem_proporcional_media', 
+                                    'rentabilidade', 'valor_unitario_medio', 'custo_unitario_medio']]
     
-    # Filtra período
-    data_limite = df_vendas['created_at'].max() - pd.Timedelta(days=periodo_dias)
-    df_periodo = df_vendas[df_vendas['created_at'] >= data_limite].copy()
-    
-    # Agrupa por SKU e data, soma quantidade
-    df_vendas_diarias = df_periodo.groupby(['sku', pd.Grouper(key='created_at', freq='D')])['quantidade'].sum().reset_index()
+    print(f"\nCalculando venda media diaria (ultimos {periodo_dias} dias)...")
     
-    # Calcula média diária por SKU
-    venda_media = df_vendas_diarias.groupby('sku')['quantidade'].mean().reset_index()
-    venda_media.columns = ['sku', 'venda_media_diaria']
+    # Filtra período com máscara aplicada direto nos arrays (sem fatiar o DataFrame)
+    # Series.max() ignora NaT (o max do numpy propagaria NaT e zeraria a máscara)
+    created_at = df_vendas['created_at'].to_numpy()
+    data_limite = (df_vendas['created_at'].max() - pd.Timedelta(days=periodo_dias)).to_datetime64()
+    mask = df_vendas['created_at'].notna().to_numpy() & (created_at >= data_limite)
+    
+    # Chaves inteiras: códigos do sku categórico (fatoração já feita) e dia desde a época
+    codigos = df_vendas['sku'].cat.codes.to_numpy()[mask]
+    dia = created_at[mask].astype('datetime64[D]').view('int64')
+    quantidade = pd.Series(df_vendas['quantidade'].to_numpy()[mask])
+    
+    # Soma por SKU e dia, depois média diária por SKU
+    vendas_diarias = quantidade.groupby([codigos, dia], sort=False).sum()
+    media_por_codigo = vendas_diarias.groupby(level=0, sort=False).mean()
+    venda_media = pd.DataFrame({
+        'sku': pd.Categorical.from_codes(media_por_codigo.index, dtype=df_vendas['sku'].dtype),
+        'venda_media_diaria': media_por_codigo.to_numpy(),
+    })
     
     print(f"[OK] Venda media calculada para {len(venda_media):,} SKUs")
     print(f"     Média geral: {venda_media['venda_media_diaria'].mean():.2f} unidades/dia")
     
-    return venda_media
+    return df_rentabilidade, venda_media
 
 
 def calcular_nivel_urgencia(df_estoque_atual, df_venda_media_diaria):
@@ -103,33 +277,48 @@ def calcular_nivel_urgencia(df_estoque_atual, df_venda_media_diaria):
     )
     
     # U(t) = Estoque Atual / Venda Média Diária
-    df_merge['nivel_urgencia'] = np.where(
-        df_merge['venda_media_diaria'] > 0,
-        df_merge['saldo'] / df_merge['venda_media_diaria'],
-        np.inf  # Se não há vendas, estoque dura "para sempre"
+    venda_media = df_merge['venda_media_diaria'].to_numpy(dtype=np.float32, copy=False)
+    
+    # Se não há vendas, estoque dura "para sempre" (np.inf); a máscara sem_vendas
+    # marca esses SKUs para filtros sem comparar contra np.inf
+    df_merge['nivel_urgencia'] = _calcular_urgencia(
+        df_merge['saldo'].to_numpy(dtype=np.float32, copy=False),
+        venda_media,
     )
+    df_merge['sem_vendas'] = ~(venda_media > 0)
     
     print(f"[OK] Nivel de urgencia calculado para {len(df_merge):,} SKUs")
-    print(f"     Média geral: {df_merge[df_merge['nivel_urgencia'] < np.inf]['nivel_urgencia'].mean():.1f} dias")
+    print(f"     Média geral: {df_merge.loc[~df_merge['sem_vendas'], 'nivel_urgencia'].mean():.1f} dias")
     
-    return df_merge[['sku', 'saldo', 'venda_media_diaria', 'nivel_urgencia']]
+    return df_merge[['sku', 'saldo', 'venda_media_diaria', 'nivel_urgencia', 'sem_vendas']]
 
 
-def carregar_estoque_atual(caminho="DB/historico_estoque_atual.csv"):
-    """Carrega estoque atual (último saldo por SKU)"""
+def carregar_estoque_atual(caminho="DB/historico_estoque_atual.csv", dtype_sku=None):
+    """
+    Carrega estoque atual (último saldo por SKU).
+    
+    Se `dtype_sku` (CategoricalDtype das vendas) for informado, o sku do estoque
+    usa as mesmas categorias, permitindo join/merge direto pelos códigos; SKUs
+    sem venda ficam fora do resultado.
+    """
     print(f"\nCarregando estoque atual: {caminho}")
     
     if not Path(caminho).exists():
         print(f"[AVISO] Arquivo nao encontrado: {caminho}")
         return None
     
-    df = pd.read_csv(caminho, low_memory=False)
-    df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
-    df['saldo'] = pd.to_numeric(df['saldo'], errors='coerce')
+    # Leitura em streaming: de cada bloco fica só o último registro por SKU
+    df = _ler_csv_com_cache(caminho, DTYPES_ESTOQUE, reduzir_bloco=_ultimo_registro_por_sku)
     df = df[df['sku'].notna()]
+    if dtype_sku is not None:
+        df = df[df['sku'].isin(dtype_sku.categories)]
+        df['sku'] = df['sku'].astype(dtype_sku)
+    else:
+        df['sku'] = df['sku'].astype('category')
     
-    # Pega último saldo por SKU (estoque atual)
-    df_estoque_atual = df.sort_values('created_at').groupby('sku').last().reset_index()[['sku', 'saldo']]
+    # Pega último saldo por SKU (estoque atual): idxmax da data, sem ordenar o histórico
+    idx_ultimo = df.groupby('sku', observed=True, sort=False)['created_at'].idxmax()
+    df_estoque_atual = df.loc[idx_ultimo, ['sku', 'saldo']].reset_index(drop=True)
     
     print(f"[OK] Estoque atual para {len(df_estoque_atual):,} SKUs")
     
@@ -150,6 +339,7 @@ def calcular_metricas_completas(salvar_resultado=True):
         - rentabilidade (R(t))
         - venda_media_diaria
         - nivel_urgencia (U(t))
+        - sem_vendas (True se não há venda média diária; U(t) = inf)
         - saldo (estoque atual)
     """
     print("=" * 80)
@@ -164,34 +354,34 @@ def calcular_metricas_completas(salvar_resultado=True):
     # 1. Carrega dados de vendas
     df_vendas = carregar_dados_vendas()
     
-    # 2. Calcula Rentabilidade R(t)
-    df_rentabilidade = calcular_rentabilidade(df_vendas)
-    
-    # 3. Calcula venda média diária
-    df_venda_media = calcular_venda_media_diaria(df_vendas)
+    # 2-3. Calcula Rentabilidade R(t) e venda média diária (mesmo agrupamento)
+    gb_sku = df_vendas.groupby('sku', observed=True, sort=False)
+    df_rentabilidade, df_venda_media = calcular_rentabilidade_e_venda_media(df_vendas, gb=gb_sku)
     
     # 4. Carrega estoque atual
-    df_estoque_atual = carregar_estoque_atual()
+    df_estoque_atual = carregar_estoque_atual(dtype_sku=df_vendas['sku'].dtype)
     
     # 5. Merge de todas as métricas
     print("\n" + "=" * 80)
     print("CONSOLIDANDO METRICAS")
     print("=" * 80)
     
-    df_final = df_rentabilidade.merge(
-        df_venda_media,
-        on='sku',
+    # Consolida por join no índice 'sku' (alinhamento direto, sem re-hash por merge)
+    df_final = df_rentabilidade.set_index('sku').join(
+        df_venda_media.set_index('sku'),
         how='left'
     )
     
     if df_estoque_atual is not None:
         df_urgencia = calcular_nivel_urgencia(df_estoque_atual, df_venda_media)
-        df_final = df_final.merge(
-            df_urgencia,
-            on='sku',
+        # venda_media_diaria já está em df_final; junta apenas as colunas novas
+        df_final = df_final.join(
+            df_urgencia.set_index('sku')[['saldo', 'nivel_urgencia', 'sem_vendas']],
             how='left'
         )
     
+    df_final = df_final.reset_index()
+    
     print(f"\n[OK] Metricas consolidadas para {len(df_final):,} SKUs")
     
     # Resumo
@@ -215,7 +405,8 @@ def calcular_metricas_completas(salvar_resultado=True):
     
     if df_estoque_atual is not None and 'nivel_urgencia' in df_final.columns:
         print(f"\nTop 10 SKUs com menor Nível de Urgência (maior risco):")
-        df_urgencia_filtrado = df_final[df_final['nivel_urgencia'] < np.inf].copy()
+        # eq(False): exclui SKUs sem vendas e também os sem estoque (NaN após o join)
+        df_urgencia_filtrado = df_final[df_final['sem_vendas'].eq(False)]
         if len(df_urgencia_filtrado) > 0:
             df_urgencia_ordenado = df_urgencia_filtrado.nsmallest(10, 'nivel_urgencia')
             colunas_mostrar = ['sku', 'nivel_urgencia', 'saldo']
@@ -9,6 +9,7 @@ Execute apos rodar analise exploratoria e comparacao de modelos.
 """
 
 import pandas as pd
+import numpy as np
 from pathlib import Path
 from datetime import datetime
 
@@ -46,12 +47,8 @@ def gerar_tabela_01_base_dados(dir_saida=None):
     df = pd.DataFrame(linhas, columns=['Variavel', 'Descricao da Variavel', 'Codigo e Rotulo da Variavel'])
 
     # Adiciona coluna de origem para clareza
-    origem = []
-    for i, r in df.iterrows():
-        if i < 3:
-            origem.append('historico_estoque')
-        else:
-            origem.append('venda_produtos')
+    # (as 3 primeiras linhas sao de historico_estoque, as demais de venda_produtos)
+    origem = np.where(np.arange(len(df)) < 3, 'historico_estoque', 'venda_produtos')
     df.insert(0, 'Fonte', origem)
 
     caminho_csv = out / 'tabela_01_base_dados.csv'
@@ -60,13 +57,18 @@ def gerar_tabela_01_base_dados(dir_saida=None):
 
     # Tambem gera versao em Markdown para visualizacao
     caminho_md = out / 'tabela_01_base_dados.md'
+    linhas_md = [
+        "# Tabela 1 - Explicacao da Base de Dados Utilizada\n",
+        "Fonte: Dados originais da pesquisa.\n",
+        "| Fonte | Variavel | Descricao da Variavel | Codigo e Rotulo da Variavel |",
+        "|-------|----------|------------------------|-----------------------------|",
+    ]
+    linhas_md += [
+        f"| {fonte} | {variavel} | {descricao} | {codigo} |"
+        for fonte, variavel, descricao, codigo in df.itertuples(index=False, name=None)
+    ]
     with open(caminho_md, 'w', encoding='utf-8') as f:
-        f.write("# Tabela 1 - Explicacao da Base de Dados Utilizada\n\n")
-        f.write("Fonte: Dados originais da pesquisa.\n\n")
-        f.write("| Fonte | Variavel | Descricao da Variavel | Codigo e Rotulo da Variavel |\n")
-        f.write("|-------|----------|------------------------|-----------------------------|\n")
-        for _, r in df.iterrows():
-            f.write(f"| {r['Fonte']} | {r['Variavel']} | {r['Descricao da Variavel']} | {r['Codigo e Rotulo da Variavel']} |\n")
+        f.write('\n'.join(linhas_md) + '\n')
     print(f"[OK] Tabela 1 (MD) salva: {caminho_md}")
 
     return df
@@ -3,65 +3,49 @@ Script para organizar arquivos nas pastas apropriadas
 Move arquivos para estrutura organizada
 """
 
+import errno
+import fnmatch
+import os
+import re
 import shutil
-from pathlib import Path
-import glob
+import sys
 
-# Mapeamento de arquivos para pastas
-MAPEAMENTO = {
-    'analises': [
-        'analise_exploratoria_sazonalidade.py',
-        'analise_box_jenkins_sarima.py',
-        'analise_sazonalidade_padroes.png',
-        'relatorio_analise_sazonalidade.txt',
-        'README_ANALISE_EXPLORATORIA.md',
-        'ANALISE_BOX_JENKINS.md',
-        'CHECKLIST_BOX_JENKINS.md',
-    ],
-    'modelos': [
-        'comparacao_modelos_previsao.py',
-        'comparacao_top_skus.py',
-        'comparacao_top_skus_otimizado.py',
-        'README_COMPARACAO_MODELOS.md',
-    ],
-    'validacao': [
-        'validacao_walk_forward_sarima.py',
-        'teste_tempo_processamento.py',
-        'tratamento_outliers_sarima.py',
-    ],
-    'previsoes': [
-        'teste_sarima_produto.py',
-    ],
-    'documentacao': [
-        'README_SARIMA.md',
-        'GUIA_RAPIDO.md',
-        'GUIA_RAPIDO_EXPLICACAO_FERRAMENTAS.md',
-        'EXPLICACAO_RESULTADOS_SARIMA.md',
-        'DOCUMENTACAO_TECNICA_FERRAMENTAS.md',
-        'explicacao_ferramentas_sarima.pdf',
-        'ORGANIZACAO_REPOSITORIO.md',
-        'RESUMO_MELHORIAS.md',
-        'README_OTIMIZACAO.md',
-    ],
-    'exemplos': [
-        'exemplo_uso_sarima.py',
-        'exemplo_elencacao_completa.py',
-    ],
-}
+from _config_organizacao import ARQUIVO_PARA_PASTA, MAPEAMENTO, PADROES
 
 # Arquivos que devem ficar na raiz
-ARQUIVOS_RAIZ = [
+ARQUIVOS_RAIZ = (
     'sarima_estoque.py',
     'requirements_sarima.txt',
     'organizar_repositorio.py',
     'organizar_arquivos.py',
+)
+
+# Padrões compilados uma única vez (casados contra a listagem já lida do diretório)
+_PADROES_COMPILADOS = [
+    (pasta, re.compile(fnmatch.translate(padrao)))
+    for pasta, padroes in PADROES.items()
+    for padrao in padroes
 ]
 
-# Padrões glob (arquivos com wildcards)
-PADROES = {
-    'modelos': ['comparacao_modelos_*.png', 'relatorio_comparacao_*.txt'],
-    'previsoes': ['previsao_sarima_*.png'],
-}
+
+def _mover_rapido(origem, destino):
+    """
+    Move arquivo com os.replace (rename atômico, sem copiar conteúdo).
+    Só recorre a shutil.move (cópia + remoção) entre sistemas de arquivos diferentes.
+    """
+    try:
+        os.replace(origem, destino)
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            shutil.move(str(origem), str(destino))
+        else:
+            raise
+
+
+def _escrever_linhas(linhas):
+    """Escreve um bloco de mensagens com uma única chamada a stdout."""
+    if linhas:
+        sys.stdout.write("\n".join(linhas) + "\n")
 
 
 def organizar_arquivos(dry_run=False):
@@ -83,65 +67,62 @@ def organizar_arquivos(dry_run=False):
     movidos = 0
     erros = 0
     
+    # Cria as pastas de destino uma única vez, antes de qualquer movimentação
+    for pasta in set(MAPEAMENTO) | set(PADROES):
+        os.makedirs(pasta, exist_ok=True)
+    
+    # Lê o diretório atual uma única vez (evita um stat por arquivo candidato)
+    entradas_raiz = {entrada.name: entrada for entrada in os.scandir('.')}
+    
+    # Mensagens acumuladas e escritas uma vez por fase (evita um print por arquivo)
+    linhas = []
+    
     # Move arquivos específicos
     for pasta, arquivos in MAPEAMENTO.items():
-        pasta_path = Path(pasta)
-        pasta_path.mkdir(exist_ok=True)
-        
-        print(f"\n[{pasta.upper()}]")
+        linhas.append(f"\n[{pasta.upper()}]")
         for arquivo in arquivos:
-            origem = Path(arquivo)
-            destino = pasta_path / arquivo
+            entrada = entradas_raiz.get(arquivo)
             
-            if origem.exists():
+            if entrada is not None:
                 if not dry_run:
                     try:
-                        shutil.move(str(origem), str(destino))
-                        print(f"  [OK] {arquivo} -> {pasta}/")
+                        _mover_rapido(entrada.path, f"{pasta}/{arquivo}")
+                        linhas.append(f"  [OK] {arquivo} -> {pasta}/")
                         movidos += 1
                     except Exception as e:
-                        print(f"  [ERRO] {arquivo}: {str(e)}")
+                        linhas.append(f"  [ERRO] {arquivo}: {str(e)}")
                         erros += 1
                 else:
-                    print(f"  [MOVED] {arquivo} -> {pasta}/")
+                    linhas.append(f"  [MOVED] {arquivo} -> {pasta}/")
             else:
-                # Tenta com padrão glob
-                encontrado = False
-                for padrao in PADROES.get(pasta, []):
-                    matches = glob.glob(padrao)
-                    if matches and arquivo in [m.replace('*', '') for m in matches if arquivo.replace('*', '') in m]:
-                        encontrado = True
-                        break
-                if not encontrado:
-                    print(f"  [NAO ENCONTRADO] {arquivo}")
+                linhas.append(f"  [NAO ENCONTRADO] {arquivo}")
     
-    # Move arquivos com padrões glob
-    print(f"\n[PADROES GLOB]")
-    for pasta, padroes in PADROES.items():
-        pasta_path = Path(pasta)
-        pasta_path.mkdir(exist_ok=True)
+    _escrever_linhas(linhas)
+    linhas = []
+    
+    # Move arquivos com padrões glob (reaproveita a mesma listagem do diretório)
+    linhas.append(f"\n[PADROES GLOB]")
+    for nome, entrada in entradas_raiz.items():
+        if nome in ARQUIVO_PARA_PASTA or not entrada.is_file():
+            continue
         
-        for padrao in padroes:
-            matches = glob.glob(padrao)
-            for match in matches:
-                origem = Path(match)
-                destino = pasta_path / origem.name
-                
-                # Não move se já está na pasta destino
-                if origem.parent == pasta_path:
-                    continue
-                
-                if origem.exists():
-                    if not dry_run:
-                        try:
-                            shutil.move(str(origem), str(destino))
-                            print(f"  [OK] {match} -> {pasta}/")
-                            movidos += 1
-                        except Exception as e:
-                            print(f"  [ERRO] {match}: {str(e)}")
-                            erros += 1
-                    else:
-                        print(f"  [MOVED] {match} -> {pasta}/")
+        for pasta, regex in _PADROES_COMPILADOS:
+            if regex.match(nome) is None:
+                continue
+            
+            if not dry_run:
+                try:
+                    _mover_rapido(entrada.path, f"{pasta}/{nome}")
+                    linhas.append(f"  [OK] {nome} -> {pasta}/")
+                    movidos += 1
+                except Exception as e:
+                    linhas.append(f"  [ERRO] {nome}: {str(e)}")
+                    erros += 1
+            else:
+                linhas.append(f"  [MOVED] {nome} -> {pasta}/")
+            break
+    
+    _escrever_linhas(linhas)
     
     print("\n" + "=" * 80)
     if dry_run:
@@ -157,13 +138,11 @@ def organizar_arquivos(dry_run=False):
     # Lista arquivos que devem ficar na raiz
     print("\nArquivos que permanecem na raiz:")
     for arq in ARQUIVOS_RAIZ:
-        if Path(arq).exists():
+        if arq in entradas_raiz:
             print(f"  - {arq}")
 
 
 if __name__ == "__main__":
-    import sys
-    
     dry_run = '--dry-run' in sys.argv or '-n' in sys.argv
     
     organizar_arquivos(dry_run=dry_run)
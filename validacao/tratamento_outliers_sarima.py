@@ -9,7 +9,8 @@ Dia das Crianças ou Black Friday.
 Métodos implementados:
 1. Método IQR (Interquartile Range)
 2. Método Z-Score
-3. Método de Suavização (para não perder dados)
+3. Método MAD (Median Absolute Deviation, Z-Score robusto)
+4. Método de Suavização (para não perder dados)
 
 Autor: Medina2713
 Data: 2024
@@ -17,12 +18,93 @@ Data: 2024
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats
 import warnings
+from pathlib import Path
+from joblib import Parallel, delayed
 warnings.filterwarnings('ignore')
 
-plt.style.use('seaborn-v0_8-darkgrid')
+# Tentar importar numba para o kernel de suavização (opcional)
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    # Sem fastmath: o kernel depende de np.isnan para ignorar valores ausentes
+    @njit(cache=True, parallel=True)
+    def _media_movel_kernel(valores, indices, janela, out):
+        n = valores.shape[0]
+        for k in prange(indices.shape[0]):
+            i = indices[k]
+            inicio = max(0, i - janela // 2)
+            fim = min(n, i + (janela - 1) // 2 + 1)
+            soma = 0.0
+            contagem = 0
+            for j in range(inicio, fim):
+                v = valores[j]
+                if not np.isnan(v):
+                    soma += v
+                    contagem += 1
+            out[k] = soma / contagem if contagem > 0 else np.nan
+
+
+def _media_movel_nos_indices(valores, indices, janela):
+    """
+    Média móvel centralizada (min_periods=1) calculada só nas posições pedidas.
+    
+    Equivale a rolling(window=janela, center=True, min_periods=1).mean()
+    avaliada em `indices`, mas usa somas acumuladas: O(N) para montar as somas
+    e O(K) para os K outliers, em vez da média móvel da série inteira.
+    NaNs são ignorados (janela só com NaN resulta em NaN).
+    
+    Com numba, cada janela é somada diretamente em paralelo, sem a passada
+    O(N) das somas acumuladas.
+    """
+    if NUMBA_AVAILABLE:
+        out = np.empty(indices.shape[0], dtype=np.float64)
+        _media_movel_kernel(valores, indices, janela, out)
+        return out
+    
+    n = valores.shape[0]
+    validos = ~np.isnan(valores)
+    soma = np.concatenate(([0.0], np.cumsum(np.where(validos, valores, 0.0))))
+    contagem = np.concatenate(([0], np.cumsum(validos)))
+    
+    # Mesma janela do pandas com center=True: [i - janela//2, i + (janela-1)//2]
+    inicio = np.clip(indices - janela // 2, 0, n)
+    fim = np.clip(indices + (janela - 1) // 2 + 1, 0, n)
+    
+    n_validos = contagem[fim] - contagem[inicio]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n_validos > 0, (soma[fim] - soma[inicio]) / n_validos, np.nan)
+
+
+# Figura reaproveitada entre chamadas de plotar_comparacao (criada sob demanda)
+_FIGURA = None
+
+
+def _obter_figura():
+    """
+    Retorna (fig, ax) da figura compartilhada, limpando o conteúdo anterior.
+    
+    Usa Figure + FigureCanvasAgg diretamente (sem pyplot): a figura não entra
+    no registro global do pyplot e não precisa de plt.close(). O matplotlib
+    só é importado aqui, quando há gráfico a gerar.
+    """
+    global _FIGURA
+    from matplotlib import style
+    style.use('seaborn-v0_8-darkgrid')
+    
+    if _FIGURA is None:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        _FIGURA = Figure(figsize=(16, 7))
+        FigureCanvasAgg(_FIGURA)
+    else:
+        _FIGURA.clear()
+    return _FIGURA, _FIGURA.add_subplot()
 
 
 class TratamentoOutliers:
@@ -39,11 +121,51 @@ class TratamentoOutliers:
         serie : pd.Series
             Série temporal a ser analisada
         """
-        self.serie_original = serie.copy()
-        self.serie = serie.copy()
+        # Cópias rasas: os dados só são duplicados se alguém os modificar
+        # (copy-on-write); os métodos de tratamento sempre geram arrays novos
+        self.serie_original = serie.copy(deep=False)
+        self.serie = serie.copy(deep=False)
         self.outliers_detectados = None
         self.metodo_usado = None
+    
+    @property
+    def serie(self):
+        """Série atual (tratada, se algum método de substituição já foi aplicado)."""
+        return self._serie
+    
+    @serie.setter
+    def serie(self, valor):
+        self._serie = valor
+        # Série mudou: arrays e máscaras (por método e parâmetro) da anterior não valem mais
+        self._cache_valores = {}
+        self._cache_outliers = {}
+    
+    def _valores(self, dtype=np.float64):
+        """
+        Valores da série atual como ndarray somente leitura, convertidos uma
+        única vez por dtype e reaproveitados até a série ser substituída.
+        """
+        valores = self._cache_valores.get(dtype)
+        if valores is None:
+            valores = self._serie.to_numpy(dtype=dtype)
+            valores.flags.writeable = False
+            self._cache_valores[dtype] = valores
+        return valores
+    
+    def _valores_deteccao(self):
+        """
+        Valores da série para a detecção, em float32 quando cabem nesse tipo
+        (metade dos bytes lidos nos quartis, média e desvio). Cai para float64
+        se a conversão estourar o limite do float32.
+        """
+        if isinstance(self.serie.dtype, pd.CategoricalDtype):
+            return self._valores(np.float64)
         
+        valores = self._valores(np.float32)
+        if np.isinf(valores).any():
+            return self._valores(np.float64)
+        return valores
+    
     def identificar_outliers_iqr(self, fator=1.5):
         """
         Identifica outliers usando o método IQR (Interquartile Range).
@@ -60,17 +182,20 @@ class TratamentoOutliers:
         pd.Series
             Série booleana indicando outliers (True = outlier)
         """
-        Q1 = self.serie.quantile(0.25)
-        Q3 = self.serie.quantile(0.75)
+        # Q1 e Q3 numa única chamada (uma passada de seleção em vez de duas)
+        valores = self._valores_deteccao()
+        Q1, Q3 = np.nanpercentile(valores, [25.0, 75.0])
         IQR = Q3 - Q1
         
         limite_inferior = Q1 - fator * IQR
         limite_superior = Q3 + fator * IQR
         
-        outliers = (self.serie < limite_inferior) | (self.serie > limite_superior)
+        outliers = pd.Series((valores < limite_inferior) | (valores > limite_superior),
+                             index=self.serie.index, name=self.serie.name)
         
         self.outliers_detectados = outliers
         self.metodo_usado = 'IQR'
+        self._cache_outliers[('iqr', fator)] = outliers
         
         return outliers
     
@@ -90,81 +215,198 @@ class TratamentoOutliers:
         pd.Series
             Série booleana indicando outliers (True = outlier)
         """
-        z_scores = np.abs(stats.zscore(self.serie.dropna()))
-        
-        # Cria série com mesmo índice
-        outliers = pd.Series(False, index=self.serie.index)
-        outliers.loc[self.serie.dropna().index] = z_scores > limite
+        # |x - média| > limite * desvio, numa única passada com buffer reaproveitado
+        valores = self._valores_deteccao()
+        validos = ~np.isnan(valores)
+        v = valores[validos]
+        
+        mascara = np.zeros(valores.shape, dtype=bool)
+        if v.size:
+            # Acumula em float64 para não perder precisão na soma
+            media = v.mean(dtype=np.float64)
+            desvio = v.std(dtype=np.float64)
+            np.subtract(v, media, out=v)
+            np.abs(v, out=v)
+            mascara[validos] = v > limite * desvio
+        
+        outliers = pd.Series(mascara, index=self.serie.index)
         
         self.outliers_detectados = outliers
         self.metodo_usado = 'Z-Score'
+        self._cache_outliers[('zscore', limite)] = outliers
         
         return outliers
     
-    def remover_outliers(self, metodo='iqr', fator=1.5, limite_zscore=3.0):
+    def identificar_outliers_mad(self, limite=3.5):
+        """
+        Identifica outliers pelo Z-Score robusto (mediana e MAD).
+        
+        Outlier = |x - mediana| > limite * 1.4826 * MAD
+        
+        Mediana e MAD não são contaminados pelos próprios outliers, ao
+        contrário da média e do desvio padrão usados no Z-Score.
+        
+        Parameters:
+        -----------
+        limite : float
+            Limite do Z-Score robusto (padrão: 3.5)
+            
+        Returns:
+        --------
+        pd.Series
+            Série booleana indicando outliers (True = outlier)
+        """
+        valores = self._valores_deteccao()
+        validos = ~np.isnan(valores)
+        v = valores[validos]
+        
+        mascara = np.zeros(valores.shape, dtype=bool)
+        if v.size:
+            mediana = np.median(v)
+            np.subtract(v, mediana, out=v)
+            np.abs(v, out=v)
+            escala = 1.4826 * np.median(v)
+            if escala == 0:
+                # Mais da metade dos valores iguais: usa o desvio absoluto médio
+                escala = 1.253314 * v.mean(dtype=np.float64)
+            if escala > 0:
+                mascara[validos] = v > limite * escala
+        
+        outliers = pd.Series(mascara, index=self.serie.index)
+        
+        self.outliers_detectados = outliers
+        self.metodo_usado = 'MAD'
+        self._cache_outliers[('mad', limite)] = outliers
+        
+        return outliers
+    
+    @staticmethod
+    def identificar_outliers_iqr_lote(df, coluna_grupo='sku', coluna_valor='estoque_atual',
+                                      fator=1.5):
+        """
+        Identifica outliers pelo método IQR em todos os grupos (ex.: SKUs) de
+        uma vez, sem instanciar a classe nem iterar grupo a grupo em Python.
+        
+        Parameters:
+        -----------
+        df : pd.DataFrame
+            Dados no formato longo (uma linha por observação)
+        coluna_grupo : str
+            Coluna que identifica a série (padrão: 'sku')
+        coluna_valor : str
+            Coluna com os valores (padrão: 'estoque_atual')
+        fator : float
+            Fator multiplicador do IQR (padrão: 1.5)
+            
+        Returns:
+        --------
+        pd.Series
+            Série booleana alinhada ao df (True = outlier dentro do seu grupo)
+        """
+        # Quartis de todos os grupos numa única chamada agrupada
+        quartis = (df.groupby(coluna_grupo, sort=False, observed=True)[coluna_valor]
+                     .quantile([0.25, 0.75]).unstack())
+        Q1 = quartis[0.25].to_numpy()
+        Q3 = quartis[0.75].to_numpy()
+        IQR = Q3 - Q1
+        
+        # Posição do grupo de cada linha (-1 = grupo ausente, ex.: chave NaN)
+        posicoes = quartis.index.get_indexer(df[coluna_grupo])
+        tem_grupo = posicoes >= 0
+        posicoes = np.where(tem_grupo, posicoes, 0)
+        
+        valores = df[coluna_valor].to_numpy(dtype=np.float64)
+        mascara = tem_grupo & (
+            (valores < (Q1 - fator * IQR)[posicoes]) | (valores > (Q3 + fator * IQR)[posicoes])
+        )
+        
+        return pd.Series(mascara, index=df.index)
+    
+    def _obter_outliers(self, metodo, fator, limite_zscore, limite_mad=3.5):
+        """
+        Retorna a máscara de outliers, reaproveitando a detecção já feita
+        com os mesmos parâmetros sobre a série atual.
+        """
+        if metodo == 'iqr':
+            chave = ('iqr', fator)
+        elif metodo == 'zscore':
+            chave = ('zscore', limite_zscore)
+        elif metodo == 'mad':
+            chave = ('mad', limite_mad)
+        else:
+            raise ValueError("Método deve ser 'iqr', 'zscore' ou 'mad'")
+        
+        if chave in self._cache_outliers:
+            self.outliers_detectados = self._cache_outliers[chave]
+            self.metodo_usado = {'iqr': 'IQR', 'zscore': 'Z-Score', 'mad': 'MAD'}[metodo]
+            return self.outliers_detectados
+        
+        if metodo == 'iqr':
+            return self.identificar_outliers_iqr(fator=fator)
+        if metodo == 'zscore':
+            return self.identificar_outliers_zscore(limite=limite_zscore)
+        return self.identificar_outliers_mad(limite=limite_mad)
+    
+    def remover_outliers(self, metodo='iqr', fator=1.5, limite_zscore=3.0, limite_mad=3.5):
         """
         Remove outliers da série.
         
         Parameters:
         -----------
         metodo : str
-            Método a usar ('iqr' ou 'zscore')
+            Método a usar ('iqr', 'zscore' ou 'mad')
         fator : float
             Fator para IQR (se método='iqr')
         limite_zscore : float
             Limite para Z-Score (se método='zscore')
+        limite_mad : float
+            Limite para o Z-Score robusto (se método='mad')
             
         Returns:
         --------
         pd.Series
             Série sem outliers (valores substituídos por NaN)
         """
-        if metodo == 'iqr':
-            outliers = self.identificar_outliers_iqr(fator=fator)
-        elif metodo == 'zscore':
-            outliers = self.identificar_outliers_zscore(limite=limite_zscore)
-        else:
-            raise ValueError("Método deve ser 'iqr' ou 'zscore'")
+        outliers = self._obter_outliers(metodo, fator, limite_zscore, limite_mad)
         
-        serie_sem_outliers = self.serie.copy()
-        serie_sem_outliers[outliers] = np.nan
+        # Atribuição direta no array (sem alinhamento de índice do pandas)
+        valores = self._valores().copy()
+        valores[outliers.to_numpy()] = np.nan
         
-        return serie_sem_outliers
+        return pd.Series(valores, index=self.serie.index, name=self.serie.name)
     
-    def substituir_outliers_mediana(self, metodo='iqr', fator=1.5, limite_zscore=3.0):
+    def substituir_outliers_mediana(self, metodo='iqr', fator=1.5, limite_zscore=3.0,
+                                    limite_mad=3.5):
         """
         Substitui outliers pela mediana da série.
         
         Parameters:
         -----------
         metodo : str
-            Método a usar ('iqr' ou 'zscore')
+            Método a usar ('iqr', 'zscore' ou 'mad')
         fator : float
             Fator para IQR (se método='iqr')
         limite_zscore : float
             Limite para Z-Score (se método='zscore')
+        limite_mad : float
+            Limite para o Z-Score robusto (se método='mad')
             
         Returns:
         --------
         pd.Series
             Série com outliers substituídos pela mediana
         """
-        if metodo == 'iqr':
-            outliers = self.identificar_outliers_iqr(fator=fator)
-        elif metodo == 'zscore':
-            outliers = self.identificar_outliers_zscore(limite=limite_zscore)
-        else:
-            raise ValueError("Método deve ser 'iqr' ou 'zscore'")
+        outliers = self._obter_outliers(metodo, fator, limite_zscore, limite_mad)
         
-        mediana = self.serie.median()
-        serie_tratada = self.serie.copy()
-        serie_tratada[outliers] = mediana
+        valores = self._valores().copy()
+        valores[outliers.to_numpy()] = np.nanmedian(valores)
+        serie_tratada = pd.Series(valores, index=self.serie.index, name=self.serie.name)
         
         self.serie = serie_tratada
         return serie_tratada
     
     def substituir_outliers_suavizacao(self, metodo='iqr', fator=1.5, limite_zscore=3.0, 
-                                      janela=5):
+                                      janela=5, limite_mad=3.5):
         """
         Substitui outliers por valores suavizados (média móvel).
         
@@ -173,33 +415,28 @@ class TratamentoOutliers:
         Parameters:
         -----------
         metodo : str
-            Método a usar ('iqr' ou 'zscore')
+            Método a usar ('iqr', 'zscore' ou 'mad')
         fator : float
             Fator para IQR (se método='iqr')
         limite_zscore : float
             Limite para Z-Score (se método='zscore')
         janela : int
             Janela para média móvel
+        limite_mad : float
+            Limite para o Z-Score robusto (se método='mad')
             
         Returns:
         --------
         pd.Series
             Série com outliers substituídos por valores suavizados
         """
-        if metodo == 'iqr':
-            outliers = self.identificar_outliers_iqr(fator=fator)
-        elif metodo == 'zscore':
-            outliers = self.identificar_outliers_zscore(limite=limite_zscore)
-        else:
-            raise ValueError("Método deve ser 'iqr' ou 'zscore'")
+        outliers = self._obter_outliers(metodo, fator, limite_zscore, limite_mad)
         
-        serie_tratada = self.serie.copy()
-        
-        # Calcula média móvel
-        media_movel = self.serie.rolling(window=janela, center=True, min_periods=1).mean()
-        
-        # Substitui outliers
-        serie_tratada[outliers] = media_movel[outliers]
+        # Substitui outliers pela média móvel calculada só nas posições afetadas
+        valores = self._valores().copy()
+        posicoes = np.flatnonzero(outliers.to_numpy())
+        valores[posicoes] = _media_movel_nos_indices(valores, posicoes, janela)
+        serie_tratada = pd.Series(valores, index=self.serie.index, name=self.serie.name)
         
         self.serie = serie_tratada
         return serie_tratada
@@ -216,12 +453,13 @@ class TratamentoOutliers:
         if self.outliers_detectados is None:
             return None
         
-        n_outliers = self.outliers_detectados.sum()
+        mascara = self.outliers_detectados.to_numpy()
+        n_outliers = mascara.sum()
         n_total = len(self.serie)
         percentual = (n_outliers / n_total) * 100
         
         if n_outliers > 0:
-            valores_outliers = self.serie_original[self.outliers_detectados]
+            valores_outliers = self.serie_original.to_numpy(dtype=np.float64)[mascara]
             stats_dict = {
                 'total_outliers': n_outliers,
                 'percentual': percentual,
@@ -229,7 +467,8 @@ class TratamentoOutliers:
                 'valor_min_outlier': valores_outliers.min(),
                 'valor_max_outlier': valores_outliers.max(),
                 'valor_medio_outlier': valores_outliers.mean(),
-                'indices_outliers': valores_outliers.index.tolist()
+                # Index (sem materializar lista); use .tolist() se precisar de lista
+                'indices_outliers': self.serie_original.index[mascara]
             }
         else:
             stats_dict = {
@@ -249,50 +488,114 @@ class TratamentoOutliers:
         caminho_saida : str, optional
             Caminho para salvar a figura
         """
-        fig, axes = plt.subplots(2, 1, figsize=(16, 10))
+        fig, ax = _obter_figura()
         
-        # Gráfico 1: Série original com outliers destacados
-        ax1 = axes[0]
-        ax1.plot(self.serie_original.index, self.serie_original.values, 
-                label='Série Original', color='steelblue', linewidth=1.5, alpha=0.7)
+        # Um único gráfico: original (desenhada uma vez), tratada e outliers por cima.
+        # Linhas rasterizadas (bitmap no savefig em vez de milhares de segmentos)
+        ax.plot(self.serie_original.index, self.serie_original.values, 
+                label='Original', color='steelblue', linewidth=1.5, alpha=0.5, rasterized=True)
+        ax.plot(self.serie.index, self.serie.values, 
+                label='Tratada', color='green', linewidth=2, alpha=0.8, rasterized=True)
         
         if self.outliers_detectados is not None and self.outliers_detectados.sum() > 0:
             outliers_vals = self.serie_original[self.outliers_detectados]
-            ax1.scatter(outliers_vals.index, outliers_vals.values, 
+            ax.scatter(outliers_vals.index, outliers_vals.values, 
                        color='red', s=50, zorder=5, label='Outliers Detectados', 
                        marker='x', linewidths=2)
         
-        ax1.set_title('Série Original com Outliers Destacados', fontweight='bold', fontsize=14)
-        ax1.set_xlabel('Data')
-        ax1.set_ylabel('Valor')
-        ax1.legend()
-        ax1.grid(True, alpha=0.3)
-        
-        # Gráfico 2: Comparação original vs tratada
-        ax2 = axes[1]
-        ax2.plot(self.serie_original.index, self.serie_original.values, 
-                label='Original', color='steelblue', linewidth=1.5, alpha=0.5)
-        ax2.plot(self.serie.index, self.serie.values, 
-                label='Tratada', color='green', linewidth=2, alpha=0.8)
-        ax2.set_title('Comparação: Original vs Tratada', fontweight='bold', fontsize=14)
-        ax2.set_xlabel('Data')
-        ax2.set_ylabel('Valor')
-        ax2.legend()
-        ax2.grid(True, alpha=0.3)
-        
-        plt.suptitle(f'Tratamento de Outliers - Método: {self.metodo_usado or "N/A"}', 
-                    fontsize=16, fontweight='bold')
-        plt.tight_layout()
+        ax.set_title('Original vs Tratada, com Outliers Destacados', fontweight='bold', fontsize=14)
+        ax.set_xlabel('Data')
+        ax.set_ylabel('Valor')
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+        
+        fig.suptitle(f'Tratamento de Outliers - Método: {self.metodo_usado or "N/A"}', 
+                     fontsize=16, fontweight='bold')
+        fig.tight_layout()
         
         if caminho_saida:
-            plt.savefig(caminho_saida, dpi=300, bbox_inches='tight')
+            fig.savefig(caminho_saida, dpi=150, bbox_inches='tight')
             print(f"\n[OK] Gráfico salvo: {caminho_saida}")
         else:
             nome_arquivo = 'tratamento_outliers.png'
-            plt.savefig(nome_arquivo, dpi=300, bbox_inches='tight')
+            fig.savefig(nome_arquivo, dpi=150, bbox_inches='tight')
             print(f"\n[OK] Gráfico salvo: {nome_arquivo}")
-        
-        plt.close()
+
+
+def _tratar_sku(sku, df_sku, metodo='iqr', fator=1.5, janela=5):
+    """
+    Trata os outliers de um único SKU (executado em processo separado).
+    
+    Returns:
+    --------
+    tuple
+        (DataFrame com data, sku, estoque_atual e estoque_tratado; nº de outliers)
+    """
+    serie = df_sku.sort_values('data').set_index('data')['estoque_atual'].dropna()
+    tratamento = TratamentoOutliers(serie)
+    serie_tratada = tratamento.substituir_outliers_suavizacao(metodo=metodo, fator=fator,
+                                                              janela=janela)
+    resultado = pd.DataFrame({
+        'data': serie.index,
+        'sku': sku,
+        'estoque_atual': serie.to_numpy(),
+        'estoque_tratado': serie_tratada.to_numpy(),
+    })
+    return resultado, int(tratamento.outliers_detectados.sum())
+
+
+def tratar_outliers_todos_skus(df, metodo='iqr', fator=1.5, janela=5, n_jobs=-1):
+    """
+    Trata outliers de todos os SKUs em paralelo (um SKU por tarefa).
+    
+    Cada SKU é independente, então os grupos são distribuídos entre
+    processos (backend 'loky' do joblib).
+    
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Dados com colunas 'data', 'sku' e 'estoque_atual'
+    metodo : str
+        Método de detecção ('iqr', 'zscore' ou 'mad')
+    fator : float
+        Fator para IQR (se método='iqr')
+    janela : int
+        Janela para média móvel da suavização
+    n_jobs : int
+        Número de processos (-1 = todos os cores)
+        
+    Returns:
+    --------
+    tuple
+        (DataFrame com as séries originais e tratadas, dict sku -> nº de outliers)
+    """
+    saidas = Parallel(n_jobs=n_jobs, backend='loky', batch_size='auto')(
+        delayed(_tratar_sku)(sku, df_sku, metodo, fator, janela)
+        for sku, df_sku in df.groupby('sku', sort=False, observed=True)
+    )
+    
+    df_tratado = pd.concat([resultado for resultado, _ in saidas], ignore_index=True)
+    n_outliers = {resultado['sku'].iat[0]: n for resultado, n in saidas if len(resultado)}
+    return df_tratado, n_outliers
+
+
+def salvar_outliers_tratados(df_tratado, caminho='DB/historico_estoque_tratado.parquet'):
+    """
+    Grava o resultado de tratar_outliers_todos_skus em Parquet (sem pyarrow,
+    grava CSV com o mesmo nome).
+    
+    Returns:
+    --------
+    Path
+        Arquivo gravado
+    """
+    caminho = Path(caminho)
+    try:
+        df_tratado.to_parquet(caminho, index=False, compression='zstd')
+    except ImportError:
+        caminho = caminho.with_suffix('.csv')
+        df_tratado.to_csv(caminho, index=False)
+    return caminho
 
 
 def main():
@@ -313,19 +616,24 @@ def main():
         return
     
     # Seleciona SKU
-    stats = df.groupby('sku')['estoque_atual'].agg(['count', 'mean', 'std']).reset_index()
-    stats = stats[stats['mean'] >= 1.0].copy()
-    stats['cv'] = stats['std'] / stats['mean']
-    stats['score'] = stats['count'] * stats['cv'] * stats['mean']
-    stats = stats.sort_values('score', ascending=False)
+    # Um único agrupamento; score calculado nos arrays e só o maior é buscado (sem ordenar)
+    stats = df.groupby('sku', sort=False)['estoque_atual'].agg(
+        count='count', mean='mean', std='std'
+    )
+    stats = stats[stats['mean'].to_numpy() >= 1.0]
+    media = stats['mean'].to_numpy()
+    cv = stats['std'].to_numpy() / media
+    score = stats['count'].to_numpy() * cv * media
     
-    sku_selecionado = stats.iloc[0]['sku']
+    sku_selecionado = stats.index[np.nanargmax(score)]
     print(f"\nSKU selecionado: {sku_selecionado}")
     
     # Prepara série temporal
     df_sku = df[df['sku'] == sku_selecionado].copy()
     df_sku = df_sku.sort_values('data').set_index('data')
-    serie = df_sku['estoque_atual'].asfreq('D', method='ffill').dropna()
+    # Série nas datas observadas: sem densificar com asfreq/ffill, que repetiria
+    # valores nas lacunas e distorceria quartis e médias da detecção
+    serie = df_sku['estoque_atual'].dropna()
     
     print(f"Observações: {len(serie)}")
     
@@ -376,8 +684,19 @@ def main():
 
 
 if __name__ == "__main__":
+    import sys
+    
     try:
-        main()
+        if '--todos-skus' in sys.argv:
+            # Todos os SKUs em paralelo, em vez do SKU de exemplo
+            df = pd.read_csv('DB/historico_estoque_atual_processado.csv', parse_dates=['data'])
+            df_tratado, n_outliers = tratar_outliers_todos_skus(df)
+            print(f"[OK] {len(n_outliers)} SKUs tratados, "
+                  f"{sum(n_outliers.values())} outliers suavizados")
+            caminho_saida = salvar_outliers_tratados(df_tratado)
+            print(f"[OK] Séries tratadas salvas: {caminho_saida}")
+        else:
+            main()
     except Exception as e:
         print(f"\n[ERRO] Erro durante execução: {str(e)}")
         import traceback
@@ -14,13 +14,55 @@ Autor: Medina2713
 Data: 2024
 """
 
+import importlib.util
 import pandas as pd
 import numpy as np
-from sklearn.metrics import mean_absolute_error, mean_squared_error
-from pmdarima import auto_arima
+from joblib import Memory, Parallel, delayed
 import warnings
 warnings.filterwarnings('ignore')
 
+# pmdarima, statsmodels e statsforecast são importados só dentro das funções
+# de ajuste: importar o módulo (ex.: para usar calcular_mape) fica rápido.
+
+# statsforecast (opcional): AutoARIMA compilado com Numba, bem mais rápido que o pmdarima
+STATSFORECAST_AVAILABLE = importlib.util.find_spec('statsforecast') is not None
+
+# Tentar importar numba para o kernel de métricas (opcional)
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    # Sem fastmath: uma previsão com NaN deve continuar gerando métricas NaN
+    @njit(cache=True)
+    def _metricas_kernel(y_real, y_previsto):
+        n = y_real.shape[0]
+        soma_abs = 0.0
+        soma_quad = 0.0
+        soma_rel = 0.0
+        contagem = 0
+        for i in range(n):
+            erro = y_real[i] - y_previsto[i]
+            erro_abs = abs(erro)
+            soma_abs += erro_abs
+            soma_quad += erro * erro
+            if y_real[i] != 0:
+                soma_rel += erro_abs / abs(y_real[i])
+                contagem += 1
+        mae = soma_abs / n
+        
+        # Desvio do erro absoluto em segunda passada (mesmo resultado do np.std)
+        soma_desvios = 0.0
+        for i in range(n):
+            desvio = abs(y_real[i] - y_previsto[i]) - mae
+            soma_desvios += desvio * desvio
+        
+        mape = soma_rel / contagem * 100 if contagem > 0 else np.nan
+        return mae, np.sqrt(soma_quad / n), mape, np.sqrt(soma_desvios / n)
+
 
 def calcular_mape(y_real, y_previsto):
     """
@@ -38,16 +80,214 @@ def calcular_mape(y_real, y_previsto):
     float
         MAPE em percentual
     """
-    y_real = np.array(y_real)
-    y_previsto = np.array(y_previsto)
+    y_real = np.asarray(y_real, dtype=np.float64)
+    y_previsto = np.asarray(y_previsto, dtype=np.float64)
     
-    # Remove valores zero para evitar divisão por zero
+    # Ignora valores zero para evitar divisão por zero
     mask = y_real != 0
-    if mask.sum() == 0:
+    n = int(mask.sum())
+    if n == 0:
         return np.nan
     
-    mape = np.mean(np.abs((y_real[mask] - y_previsto[mask]) / y_real[mask])) * 100
-    return mape
+    # Divide só onde y_real != 0, sem cópias indexadas dos arrays
+    erro_relativo = np.abs(y_real - y_previsto)
+    np.divide(erro_relativo, np.abs(y_real), out=erro_relativo, where=mask)
+    erro_relativo[~mask] = 0.0
+    return erro_relativo.sum() / n * 100
+
+
+def _calcular_metricas(y_real, y_previsto):
+    """
+    Calcula MAE, RMSE, MAPE e média/desvio do erro absoluto a partir de um
+    único vetor de resíduos.
+    
+    Returns:
+    --------
+    tuple
+        (mae, rmse, mape, erro_medio, erro_std)
+    """
+    if NUMBA_AVAILABLE:
+        mae, rmse, mape, erro_std = _metricas_kernel(
+            np.ascontiguousarray(y_real, dtype=np.float64),
+            np.ascontiguousarray(y_previsto, dtype=np.float64)
+        )
+        return mae, rmse, mape, mae, erro_std
+    
+    erro = y_real - y_previsto
+    erro_abs = np.abs(erro)
+    mae = erro_abs.mean()
+    rmse = np.sqrt(np.dot(erro, erro) / erro.size)
+    
+    mask = y_real != 0
+    n = int(mask.sum())
+    if n == 0:
+        mape = np.nan
+    else:
+        erro_relativo = np.divide(erro_abs, np.abs(y_real), out=np.zeros_like(erro_abs), where=mask)
+        mape = erro_relativo.sum() / n * 100
+    
+    return mae, rmse, mape, mae, erro_abs.std()
+
+
+def _decompor_stl(y, periodo_sazonal):
+    """
+    Decompõe y com STL e retorna (série dessazonalizada, componente sazonal).
+    """
+    from statsmodels.tsa.seasonal import STL
+    
+    # Suavizador sazonal deve ser ímpar: 30 -> 31, 7 -> 7
+    suavizador = periodo_sazonal + 1 - periodo_sazonal % 2
+    decomposicao = STL(y, period=periodo_sazonal, seasonal=suavizador).fit()
+    sazonal = np.asarray(decomposicao.seasonal)
+    return y - sazonal, sazonal
+
+
+def _distribuicao_ordens(folds_validos):
+    """
+    Conta as ordens (p, d, q) dos folds a partir das colunas inteiras p, d, q,
+    sem comparar tuplas Python linha a linha.
+    
+    Returns:
+    --------
+    list of tuple
+        [((p, d, q), n_folds), ...] do mais para o menos frequente
+        (empates na ordem da primeira ocorrência, como o value_counts)
+    """
+    ordens = folds_validos[['p', 'd', 'q']].to_numpy(dtype=np.int64)
+    unicas, primeira, contagens = np.unique(
+        ordens, axis=0, return_index=True, return_counts=True
+    )
+    posicao = np.lexsort((primeira, -contagens))
+    return [(tuple(int(v) for v in unicas[i]), int(contagens[i])) for i in posicao]
+
+
+def _ajustar_auto_arima(y_treino, backend, periodo_sazonal, max_p, max_q, max_order,
+                        metodo_otimizacao='nm', maxiter=50, aproximacao=True):
+    """
+    Ajusta o Auto-ARIMA em y_treino.
+    
+    Função de módulo (e não método) para servir de chave ao joblib.Memory:
+    o cache é indexado pelo conteúdo de y_treino e pela configuração da busca.
+    
+    Janelas com menos de dois ciclos sazonais não permitem estimar a parte
+    sazonal: nesse caso o ajuste é feito com um ARIMA não sazonal.
+    
+    Returns:
+    --------
+    tuple
+        (modelo, order, seasonal_order, aic)
+    """
+    sazonal = len(y_treino) >= 2 * periodo_sazonal
+    
+    if backend == 'statsforecast':
+        from statsforecast.models import AutoARIMA as StatsForecastAutoARIMA
+        
+        modelo = StatsForecastAutoARIMA(
+            season_length=periodo_sazonal if sazonal else 1,
+            max_p=max_p, max_d=2, max_q=max_q,
+            max_P=1, max_D=1, max_Q=1,
+            max_order=max_order,
+            stepwise=True,
+            approximation=aproximacao
+        ).fit(y_treino)
+        # arma = (p, q, P, Q, m, d, D)
+        p, q, P, Q, m, d, D = modelo.model_['arma']
+        return modelo, (p, d, q), (P, D, Q, m), modelo.model_['aic']
+    
+    from pmdarima import ARIMA, auto_arima
+    
+    if backend == 'stl_arima':
+        # ARIMA não sazonal na série dessazonalizada (tendência + resíduo):
+        # o estado do filtro cai de ~m para p+q
+        if sazonal:
+            y_treino, _ = _decompor_stl(y_treino, periodo_sazonal)
+        sazonal = False
+    
+    # Com aproximação, os candidatos são avaliados com a verossimilhança
+    # condicional (diferenciação fora do estado, como o CSS) e só o vencedor
+    # é reestimado por máxima verossimilhança exata
+    modelo = auto_arima(
+        y_treino,
+        seasonal=sazonal,
+        m=periodo_sazonal if sazonal else 1,
+        stepwise=True,
+        suppress_warnings=True,
+        error_action='ignore',
+        max_p=max_p, max_d=2, max_q=max_q,
+        max_P=1, max_D=1, max_Q=1,
+        max_order=max_order,
+        information_criterion='aic',
+        method=metodo_otimizacao,
+        maxiter=maxiter,
+        trace=False,
+        n_jobs=1,
+        sarimax_kwargs={'simple_differencing': True} if aproximacao else None
+    )
+    
+    if aproximacao and (modelo.order[1] > 0 or modelo.seasonal_order[1] > 0):
+        modelo = ARIMA(
+            order=modelo.order,
+            seasonal_order=modelo.seasonal_order,
+            with_intercept=modelo.with_intercept,
+            method=metodo_otimizacao,
+            maxiter=maxiter,
+            suppress_warnings=True
+        ).fit(y_treino)
+    
+    return modelo, modelo.order, modelo.seasonal_order, modelo.aic()
+
+
+def _prever_auto_arima(modelo, backend, y_treino, n_ajuste, n_teste, periodo_sazonal):
+    """
+    Prevê n_teste períodos após y_treino com um modelo ajustado nas
+    n_ajuste primeiras observações.
+    
+    As observações posteriores ao ajuste apenas estendem o filtro de Kalman
+    com os parâmetros já estimados (sem nova estimação por máxima verossimilhança).
+    """
+    if backend == 'statsforecast':
+        if n_ajuste == len(y_treino):
+            return modelo.predict(h=n_teste)['mean']
+        return modelo.forward(y=y_treino, h=n_teste)['mean']
+    
+    if backend == 'stl_arima' and n_ajuste >= 2 * periodo_sazonal:
+        # Sazonalidade projetada de forma ingênua: repete o último ciclo do STL
+        m = periodo_sazonal
+        dessazonalizada, sazonal = _decompor_stl(y_treino, m)
+        projecao_sazonal = sazonal[len(sazonal) - m + np.arange(n_teste) % m]
+        if n_ajuste == len(y_treino):
+            previsao = modelo.predict(n_periods=n_teste)
+        else:
+            # Reaplica os parâmetros ajustados à nova decomposição, sem reestimar
+            previsao = modelo.arima_res_.apply(dessazonalizada).forecast(steps=n_teste)
+        return np.asarray(previsao) + projecao_sazonal
+    
+    if n_ajuste == len(y_treino):
+        return np.asarray(modelo.predict(n_periods=n_teste))
+    resultado = modelo.arima_res_.append(y_treino[n_ajuste:], refit=False)
+    return np.asarray(resultado.forecast(steps=n_teste))
+
+
+_FIGURA = None
+
+
+def _obter_figura():
+    """
+    Retorna (fig, axes) da figura 2x2 compartilhada, limpando o conteúdo anterior.
+    
+    Usa Figure + FigureCanvasAgg diretamente (sem pyplot), com layout
+    'constrained' no lugar do tight_layout; chamadas repetidas reaproveitam
+    a mesma figura.
+    """
+    global _FIGURA
+    if _FIGURA is None:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        _FIGURA = Figure(figsize=(16, 10), layout='constrained')
+        FigureCanvasAgg(_FIGURA)
+    else:
+        _FIGURA.clear()
+    return _FIGURA, _FIGURA.subplots(2, 2)
 
 
 class ValidacaoWalkForward:
@@ -59,7 +299,10 @@ class ValidacaoWalkForward:
     """
     
     def __init__(self, serie, tamanho_treino_inicial=0.7, tamanho_teste=0.1, 
-                 passo=1, periodo_sazonal=30):
+                 passo=1, periodo_sazonal=30, backend='statsforecast',
+                 max_p=2, max_q=2, max_order=2, cache_dir='cache_walk_forward',
+                 refit_a_cada=10, metodo_otimizacao='nm', maxiter=50,
+                 aproximacao=True):
         """
         Inicializa a validação walk-forward.
         
@@ -75,22 +318,180 @@ class ValidacaoWalkForward:
             Número de períodos a avançar em cada fold (1 = um período por vez)
         periodo_sazonal : int
             Período sazonal para o modelo SARIMA
+        backend : str
+            'statsforecast' (AutoARIMA com Numba, padrão), 'pmdarima' ou
+            'stl_arima' (decomposição STL + ARIMA não sazonal do pmdarima na
+            série dessazonalizada; evita o estado grande do SARIMA com m=30).
+            Sem statsforecast instalado, usa pmdarima.
+        max_p, max_q : int
+            Ordens máximas AR e MA da busca do Auto-ARIMA (P e Q sazonais até 1)
+        max_order : int
+            Soma máxima p+q+P+Q (limite aplicado pelo pmdarima na busca não-stepwise)
+        
+        Nota: espaços de busca maiores quase não melhoram o erro de previsão
+        (o AIC nem sempre acompanha a acurácia fora da amostra), mas
+        multiplicam o tempo de ajuste de cada fold; por isso o padrão é 2,
+        como no ARIMA_PLUS do BigQuery.
+        cache_dir : str or None
+            Diretório do cache (joblib.Memory) dos ajustes por fold. Reexecuções
+            com a mesma série e configuração não reajustam os modelos.
+            None desativa o cache.
+        refit_a_cada : int
+            Frequência (em folds) do Auto-ARIMA completo. Entre dois ajustes,
+            os folds reaproveitam o modelo e apenas estendem o filtro de Kalman
+            com as novas observações. 1 = reajusta em todos os folds.
+        metodo_otimizacao : str
+            Otimizador do statsmodels na estimação de cada candidato do
+            pmdarima ('nm' = Nelder-Mead, padrão; 'lbfgs' = padrão do pmdarima)
+        maxiter : int
+            Máximo de iterações do otimizador
+        aproximacao : bool
+            Se True, a busca stepwise compara candidatos pela verossimilhança
+            condicional (mais barata) e só o modelo escolhido é reestimado
+            por máxima verossimilhança exata
         """
+        if backend not in ('statsforecast', 'pmdarima', 'stl_arima'):
+            raise ValueError("backend deve ser 'statsforecast', 'pmdarima' ou 'stl_arima'")
+        if backend == 'statsforecast' and not STATSFORECAST_AVAILABLE:
+            backend = 'pmdarima'
         self.serie = serie.copy()
         self.tamanho_treino_inicial = tamanho_treino_inicial
         self.tamanho_teste = tamanho_teste
         self.passo = passo
         self.periodo_sazonal = periodo_sazonal
+        self.backend = backend
+        self.max_p = max_p
+        self.max_q = max_q
+        self.max_order = max_order
+        self.refit_a_cada = max(1, int(refit_a_cada))
+        self.metodo_otimizacao = metodo_otimizacao
+        self.maxiter = maxiter
+        self.aproximacao = aproximacao
+        self._memoria = Memory(cache_dir, verbose=0) if cache_dir else None
         self.resultados = []
+        self._df_resultados = None  # DataFrame de self.resultados (montado uma vez)
+    
+    def _obter_df_resultados(self):
+        """
+        Retorna os resultados como DataFrame, montado uma única vez e
+        reaproveitado pelo relatório e pelos gráficos.
+        """
+        if self._df_resultados is None:
+            self._df_resultados = pd.DataFrame(self.resultados)
+        return self._df_resultados
+    
+    def _ajustar_modelo(self, y_treino):
+        """
+        Ajusta o Auto-ARIMA no treino, reaproveitando o cache em disco
+        quando habilitado.
+        
+        Returns:
+        --------
+        tuple
+            (modelo, order, seasonal_order, aic)
+        """
+        ajustar = _ajustar_auto_arima
+        if self._memoria is not None:
+            ajustar = self._memoria.cache(_ajustar_auto_arima)
+        return ajustar(
+            y_treino, self.backend, self.periodo_sazonal,
+            self.max_p, self.max_q, self.max_order,
+            self.metodo_otimizacao, self.maxiter, self.aproximacao
+        )
+        
+    def _executar_bloco(self, valores, folds, n_teste):
+        """
+        Treina e avalia um bloco de folds consecutivos (executado em paralelo
+        pelo joblib).
+        
+        O Auto-ARIMA completo roda apenas no primeiro fold do bloco; os
+        seguintes reaproveitam a ordem e os parâmetros e só estendem o filtro
+        com as novas observações. Ordem e AIC reportados são os do ajuste, e
+        'reajustado' indica se a ordem do fold foi escolhida com os dados do
+        próprio fold (e não reaproveitada).
+        
+        Returns:
+        --------
+        list of dict
+            Métricas de cada fold, ou a mensagem de erro em 'erro'
+        """
+        resultados = []
+        ajuste = None
+        
+        for fold, pos_treino_fim in folds:
+            # Fatias são views do array, sem construir Series por fold
+            y_treino = valores[:pos_treino_fim]
+            y_teste = valores[pos_treino_fim:pos_treino_fim + n_teste]
+            
+            try:
+                reajustado = ajuste is None
+                if ajuste is None and y_treino.std() < 1e-9:
+                    # Janela constante: a busca terminaria em (0,0,0); a
+                    # previsão é o último valor, sem ajustar modelo
+                    previsao = np.full(len(y_teste), y_treino[-1])
+                    order = (0, 0, 0)
+                    seasonal_order = (0, 0, 0, self.periodo_sazonal)
+                    aic = np.nan
+                else:
+                    if ajuste is None:
+                        modelo, order, seasonal_order, aic = self._ajustar_modelo(y_treino)
+                        ajuste = (modelo, len(y_treino))
+                    previsao = _prever_auto_arima(
+                        ajuste[0], self.backend, y_treino, ajuste[1], len(y_teste),
+                        self.periodo_sazonal
+                    )
+                previsao = np.maximum(previsao, 0)  # Garante não-negativo
+                
+                # Calcula métricas
+                mae, rmse, mape, erro_medio, erro_std = _calcular_metricas(y_teste, previsao)
+                
+                resultados.append({
+                    'fold': fold,
+                    'tamanho_treino': len(y_treino),
+                    'tamanho_teste': len(y_teste),
+                    'indice_treino_fim': pos_treino_fim - 1,
+                    'indice_teste_inicio': pos_treino_fim,
+                    'indice_teste_fim': pos_treino_fim + n_teste - 1,
+                    'modelo_order': order,
+                    'modelo_seasonal_order': seasonal_order,
+                    # Ordens também em colunas inteiras, para contagens vetorizadas
+                    'p': order[0], 'd': order[1], 'q': order[2],
+                    'P': seasonal_order[0], 'D': seasonal_order[1],
+                    'Q': seasonal_order[2], 'm': seasonal_order[3],
+                    'aic': aic,
+                    'reajustado': reajustado,
+                    'mae': mae,
+                    'rmse': rmse,
+                    'mape': mape,
+                    'erro_medio': erro_medio,
+                    'erro_std': erro_std
+                })
+            except Exception as e:
+                # Próximo fold refaz o ajuste completo
+                ajuste = None
+                resultados.append({
+                    'fold': fold,
+                    'tamanho_treino': len(y_treino),
+                    'tamanho_teste': len(y_teste),
+                    'erro': str(e)
+                })
         
-    def executar_validacao(self, verbose=True):
+        return resultados
+    
+    def executar_validacao(self, verbose=True, n_jobs=-1):
         """
         Executa validação walk-forward completa.
         
+        Os folds são agrupados em blocos de `refit_a_cada` folds; os blocos
+        são independentes e rodam em paralelo (joblib/loky). O progresso de
+        cada fold é impresso ao final, na ordem dos folds.
+        
         Parameters:
         -----------
         verbose : bool
             Se True, imprime progresso
+        n_jobs : int
+            Número de processos paralelos (-1 = todos os núcleos)
             
         Returns:
         --------
@@ -105,102 +506,55 @@ class ValidacaoWalkForward:
             print(f"Tamanho inicial de treino: {self.tamanho_treino_inicial*100:.0f}%")
             print(f"Tamanho de teste por fold: {self.tamanho_teste*100:.0f}%")
             print(f"Passo entre folds: {self.passo} períodos")
+            print(f"Backend: {self.backend} | reajuste completo a cada {self.refit_a_cada} folds")
         
         n_total = len(self.serie)
         n_treino_inicial = int(n_total * self.tamanho_treino_inicial)
         n_teste = max(1, int(n_total * self.tamanho_teste))
         
-        # Posição inicial
-        pos_treino_fim = n_treino_inicial
-        fold = 1
+        # Fim do treino de cada fold
+        folds = [
+            (fold, pos_treino_fim) for fold, pos_treino_fim
+            in enumerate(range(n_treino_inicial, n_total - n_teste + 1, self.passo), start=1)
+        ]
         
-        while pos_treino_fim + n_teste <= n_total:
-            # Define janelas de treino e teste
-            serie_treino = self.serie.iloc[:pos_treino_fim]
-            serie_teste = self.serie.iloc[pos_treino_fim:pos_treino_fim + n_teste]
-            
-            if verbose:
-                print(f"\n{'='*80}")
-                print(f"FOLD {fold}")
-                print(f"{'='*80}")
-                print(f"Treino: {len(serie_treino)} observações (até índice {pos_treino_fim-1})")
-                print(f"Teste: {len(serie_teste)} observações (índices {pos_treino_fim} a {pos_treino_fim+n_teste-1})")
-            
-            # Treina modelo
-            try:
-                modelo = auto_arima(
-                    serie_treino,
-                    seasonal=True,
-                    m=self.periodo_sazonal,
-                    stepwise=True,
-                    suppress_warnings=True,
-                    error_action='ignore',
-                    max_p=5, max_d=2, max_q=5,
-                    max_P=2, max_D=1, max_Q=2,
-                    information_criterion='aic',
-                    trace=False,
-                    n_jobs=1
-                )
-                
-                # Gera previsão
-                previsao = modelo.predict(n_periods=len(serie_teste))
-                previsao = np.maximum(previsao, 0)  # Garante não-negativo
-                
-                # Calcula métricas
-                mae = mean_absolute_error(serie_teste.values, previsao)
-                rmse = np.sqrt(mean_squared_error(serie_teste.values, previsao))
-                mape = calcular_mape(serie_teste.values, previsao)
-                
-                # Armazena resultados
-                resultado_fold = {
-                    'fold': fold,
-                    'tamanho_treino': len(serie_treino),
-                    'tamanho_teste': len(serie_teste),
-                    'indice_treino_fim': pos_treino_fim - 1,
-                    'indice_teste_inicio': pos_treino_fim,
-                    'indice_teste_fim': pos_treino_fim + n_teste - 1,
-                    'modelo_order': modelo.order,
-                    'modelo_seasonal_order': modelo.seasonal_order,
-                    'aic': modelo.aic(),
-                    'mae': mae,
-                    'rmse': rmse,
-                    'mape': mape,
-                    'erro_medio': np.mean(np.abs(serie_teste.values - previsao)),
-                    'erro_std': np.std(np.abs(serie_teste.values - previsao))
-                }
-                
-                self.resultados.append(resultado_fold)
-                
-                if verbose:
-                    print(f"  Modelo: {modelo.order} x {modelo.seasonal_order}")
-                    print(f"  AIC: {modelo.aic():.2f}")
-                    print(f"  MAE: {mae:.2f}")
-                    print(f"  RMSE: {rmse:.2f}")
-                    print(f"  MAPE: {mape:.2f}%")
-                
-            except Exception as e:
-                if verbose:
-                    print(f"  [ERRO] Falha no fold {fold}: {str(e)}")
-                resultado_fold = {
-                    'fold': fold,
-                    'tamanho_treino': len(serie_treino),
-                    'tamanho_teste': len(serie_teste),
-                    'erro': str(e)
-                }
-                self.resultados.append(resultado_fold)
-            
-            # Avança para próximo fold
-            pos_treino_fim += self.passo
-            fold += 1
-            
-            # Limite de segurança (evita loops infinitos)
-            if fold > 100:
-                if verbose:
-                    print("\n[AVISO] Limite de 100 folds atingido. Interrompendo...")
-                break
+        # Limite de segurança (evita validações excessivamente longas)
+        limite_atingido = len(folds) > 100
+        folds = folds[:100]
+        
+        valores = self.serie.to_numpy(dtype=np.float64, copy=False)
+        blocos = Parallel(n_jobs=n_jobs, backend='loky')(
+            delayed(self._executar_bloco)(valores, folds[i:i + self.refit_a_cada], n_teste)
+            for i in range(0, len(folds), self.refit_a_cada)
+        )
+        self.resultados = [resultado for bloco in blocos for resultado in bloco]
+        self._df_resultados = None
+        
+        if verbose:
+            # Monta o detalhamento de todos os folds e escreve de uma vez
+            linhas = []
+            for resultado_fold in self.resultados:
+                fold = resultado_fold['fold']
+                pos_treino_fim = resultado_fold['tamanho_treino']
+                linhas.append(f"\n{'='*80}")
+                linhas.append(f"FOLD {fold}")
+                linhas.append(f"{'='*80}")
+                linhas.append(f"Treino: {pos_treino_fim} observações (até índice {pos_treino_fim-1})")
+                linhas.append(f"Teste: {resultado_fold['tamanho_teste']} observações (índices {pos_treino_fim} a {pos_treino_fim+n_teste-1})")
+                if 'erro' in resultado_fold:
+                    linhas.append(f"  [ERRO] Falha no fold {fold}: {resultado_fold['erro']}")
+                else:
+                    linhas.append(f"  Modelo: {resultado_fold['modelo_order']} x {resultado_fold['modelo_seasonal_order']}")
+                    linhas.append(f"  AIC: {resultado_fold['aic']:.2f}")
+                    linhas.append(f"  MAE: {resultado_fold['mae']:.2f}")
+                    linhas.append(f"  RMSE: {resultado_fold['rmse']:.2f}")
+                    linhas.append(f"  MAPE: {resultado_fold['mape']:.2f}%")
+            if limite_atingido:
+                linhas.append("\n[AVISO] Limite de 100 folds atingido. Interrompendo...")
+            print("\n".join(linhas))
         
         # Cria DataFrame com resultados
-        df_resultados = pd.DataFrame(self.resultados)
+        df_resultados = self._obter_df_resultados()
         
         if verbose:
             print("\n" + "=" * 80)
@@ -220,13 +574,19 @@ class ValidacaoWalkForward:
                     print(f"  RMSE std: {folds_validos['rmse'].std():.2f}")
                     print(f"  MAPE std: {folds_validos['mape'].std():.2f}%")
                     
-                    # Estabilidade do modelo
+                    # Estabilidade do modelo (só folds com ordem escolhida no próprio fold)
                     if 'modelo_order' in folds_validos.columns:
-                        modelos_unicos = folds_validos['modelo_order'].nunique()
+                        folds_ajustados = folds_validos[folds_validos['reajustado'].astype(bool)]
+                        modelos_unicos = len(_distribuicao_ordens(folds_ajustados))
                         print(f"\nEstabilidade do Modelo:")
+                        print(f"  Ajustes completos: {len(folds_ajustados)} de {len(folds_validos)} folds "
+                              f"(refit_a_cada={self.refit_a_cada})")
                         print(f"  Modelos únicos encontrados: {modelos_unicos}")
-                        if modelos_unicos == 1:
-                            print("  ✓ Modelo estável (mesma ordem em todos os folds)")
+                        if len(folds_ajustados) < 2:
+                            print("  ⚠ Menos de 2 ajustes completos: estabilidade não avaliada "
+                                  "(use refit_a_cada menor)")
+                        elif modelos_unicos == 1:
+                            print("  ✓ Modelo estável (mesma ordem em todos os ajustes)")
                         else:
                             print(f"  ⚠ Modelo variou entre folds (pode indicar instabilidade)")
         
@@ -241,26 +601,24 @@ class ValidacaoWalkForward:
         caminho_saida : str, optional
             Caminho para salvar a figura
         """
-        import matplotlib.pyplot as plt
-        
         if len(self.resultados) == 0:
             print("[AVISO] Nenhum resultado para plotar. Execute executar_validacao() primeiro.")
             return
         
-        df_resultados = pd.DataFrame(self.resultados)
+        df_resultados = self._obter_df_resultados()
         
         if 'mae' not in df_resultados.columns:
             print("[AVISO] Não há métricas para plotar.")
             return
         
-        fig, axes = plt.subplots(2, 2, figsize=(16, 10))
+        fig, axes = _obter_figura()
         
         folds_validos = df_resultados[df_resultados['mae'].notna()]
         
         # 1. Evolução do MAE ao longo dos folds
         ax1 = axes[0, 0]
         ax1.plot(folds_validos['fold'], folds_validos['mae'], 
-                marker='o', linewidth=2, markersize=6, color='steelblue')
+                marker='o', linewidth=2, markersize=6, color='steelblue', rasterized=True)
         ax1.axhline(y=folds_validos['mae'].mean(), color='red', 
                    linestyle='--', linewidth=2, label=f'Média: {folds_validos["mae"].mean():.2f}')
         ax1.set_title('Evolução do MAE por Fold', fontweight='bold', fontsize=12)
@@ -272,7 +630,7 @@ class ValidacaoWalkForward:
         # 2. Evolução do RMSE
         ax2 = axes[0, 1]
         ax2.plot(folds_validos['fold'], folds_validos['rmse'], 
-                marker='s', linewidth=2, markersize=6, color='orange')
+                marker='s', linewidth=2, markersize=6, color='orange', rasterized=True)
         ax2.axhline(y=folds_validos['rmse'].mean(), color='red', 
                    linestyle='--', linewidth=2, label=f'Média: {folds_validos["rmse"].mean():.2f}')
         ax2.set_title('Evolução do RMSE por Fold', fontweight='bold', fontsize=12)
@@ -284,7 +642,7 @@ class ValidacaoWalkForward:
         # 3. Evolução do MAPE
         ax3 = axes[1, 0]
         ax3.plot(folds_validos['fold'], folds_validos['mape'], 
-                marker='^', linewidth=2, markersize=6, color='green')
+                marker='^', linewidth=2, markersize=6, color='green', rasterized=True)
         ax3.axhline(y=folds_validos['mape'].mean(), color='red', 
                    linestyle='--', linewidth=2, label=f'Média: {folds_validos["mape"].mean():.2f}%')
         ax3.set_title('Evolução do MAPE por Fold', fontweight='bold', fontsize=12)
@@ -296,7 +654,7 @@ class ValidacaoWalkForward:
         # 4. Distribuição dos erros
         ax4 = axes[1, 1]
         ax4.hist(folds_validos['mae'], bins=min(20, len(folds_validos)), 
-                color='skyblue', edgecolor='black', alpha=0.7)
+                color='skyblue', edgecolor='black', alpha=0.7, rasterized=True)
         ax4.axvline(x=folds_validos['mae'].mean(), color='red', 
                    linestyle='--', linewidth=2, label=f'Média: {folds_validos["mae"].mean():.2f}')
         ax4.set_title('Distribuição do MAE', fontweight='bold', fontsize=12)
@@ -305,19 +663,16 @@ class ValidacaoWalkForward:
         ax4.legend()
         ax4.grid(True, alpha=0.3, axis='y')
         
-        plt.suptitle('Validação Walk-Forward - Resultados', 
+        fig.suptitle('Validação Walk-Forward - Resultados', 
                     fontsize=16, fontweight='bold')
-        plt.tight_layout()
         
         if caminho_saida:
-            plt.savefig(caminho_saida, dpi=300, bbox_inches='tight')
+            fig.savefig(caminho_saida, dpi=150, bbox_inches='tight')
             print(f"\n[OK] Gráfico salvo: {caminho_saida}")
         else:
             nome_arquivo = 'validacao_walk_forward.png'
-            plt.savefig(nome_arquivo, dpi=300, bbox_inches='tight')
+            fig.savefig(nome_arquivo, dpi=150, bbox_inches='tight')
             print(f"\n[OK] Gráfico salvo: {nome_arquivo}")
-        
-        plt.close()
     
     def gerar_relatorio(self, caminho_saida=None):
         """
@@ -337,8 +692,11 @@ class ValidacaoWalkForward:
         linhas.append(f"Tamanho inicial de treino: {self.tamanho_treino_inicial*100:.0f}%")
         linhas.append(f"Tamanho de teste por fold: {self.tamanho_teste*100:.0f}%")
         linhas.append(f"Passo entre folds: {self.passo}")
+        linhas.append(f"Backend: {self.backend}")
+        linhas.append(f"Reajuste completo a cada: {self.refit_a_cada} folds "
+                      f"(nos demais, ordem e parâmetros são reaproveitados)")
         
-        df_resultados = pd.DataFrame(self.resultados)
+        df_resultados = self._obter_df_resultados()
         linhas.append(f"\nTotal de folds executados: {len(df_resultados)}")
         
         if 'mae' in df_resultados.columns:
@@ -360,23 +718,29 @@ class ValidacaoWalkForward:
                 linhas.append(f"RMSE - Desvio padrão: {folds_validos['rmse'].std():.2f}")
                 linhas.append(f"MAPE - Desvio padrão: {folds_validos['mape'].std():.2f}%")
                 
-                # Estabilidade
+                # Estabilidade: só folds com ordem escolhida no próprio fold
+                # (os demais repetem a ordem do último ajuste completo)
                 if 'modelo_order' in folds_validos.columns:
-                    modelos_unicos = folds_validos['modelo_order'].nunique()
+                    folds_ajustados = folds_validos[folds_validos['reajustado'].astype(bool)]
+                    dist_modelos = _distribuicao_ordens(folds_ajustados)
+                    modelos_unicos = len(dist_modelos)
                     linhas.append("\n" + "-" * 80)
                     linhas.append("ESTABILIDADE DO MODELO")
                     linhas.append("-" * 80)
+                    linhas.append(f"Ajustes completos: {len(folds_ajustados)} de {len(folds_validos)} folds válidos")
                     linhas.append(f"Modelos únicos encontrados: {modelos_unicos}")
                     
-                    if modelos_unicos == 1:
-                        modelo_mais_comum = folds_validos['modelo_order'].mode()[0]
+                    if len(folds_ajustados) < 2:
+                        linhas.append("⚠ Menos de 2 ajustes completos: estabilidade não avaliada")
+                        linhas.append("  Recomendação: usar refit_a_cada menor que o número de folds")
+                    elif modelos_unicos == 1:
+                        modelo_mais_comum = dist_modelos[0][0]
                         linhas.append(f"✓ Modelo estável: {modelo_mais_comum}")
                     else:
-                        linhas.append("⚠ Modelo variou entre folds")
+                        linhas.append("⚠ Modelo variou entre ajustes")
                         linhas.append("\nDistribuição de modelos:")
-                        dist_modelos = folds_validos['modelo_order'].value_counts()
-                        for modelo, count in dist_modelos.items():
-                            linhas.append(f"  {modelo}: {count} folds ({count/len(folds_validos)*100:.1f}%)")
+                        for modelo, count in dist_modelos:
+                            linhas.append(f"  {modelo}: {count} ajustes ({count/len(folds_ajustados)*100:.1f}%)")
                 
                 # Conclusão
                 linhas.append("\n" + "=" * 80)
@@ -11,6 +11,137 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 
+from calcular_metricas_elencacao import (
+    DTYPES_ESTOQUE, DTYPES_VENDAS, _ler_csv_com_cache, _ultimo_registro_por_sku,
+)
+
+# Colunas de venda_produtos usadas na validação (venda_id conta as transações)
+DTYPES_VENDAS_VALIDACAO = {**DTYPES_VENDAS, 'venda_id': 'Int64'}
+
+# Tentar importar numba para o kernel de agregação por SKU (opcional)
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    # Serial de propósito: em paralelo, linhas do mesmo SKU disputariam o
+    # mesmo acumulador. NaNs são ignorados, como no sum/mean/count do pandas.
+    @njit(cache=True)
+    def _agregar_kernel(codigos, quantidade, margem, valor, custo, tem_venda_id, n_grupos):
+        soma_qtd = np.zeros(n_grupos)
+        soma_margem = np.zeros(n_grupos)
+        n_margem = np.zeros(n_grupos, dtype=np.int64)
+        soma_valor = np.zeros(n_grupos)
+        n_valor = np.zeros(n_grupos, dtype=np.int64)
+        soma_custo = np.zeros(n_grupos)
+        n_custo = np.zeros(n_grupos, dtype=np.int64)
+        n_vendas = np.zeros(n_grupos, dtype=np.int64)
+        for i in range(codigos.shape[0]):
+            g = codigos[i]
+            if not np.isnan(quantidade[i]):
+                soma_qtd[g] += quantidade[i]
+            if not np.isnan(margem[i]):
+                soma_margem[g] += margem[i]
+                n_margem[g] += 1
+            if not np.isnan(valor[i]):
+                soma_valor[g] += valor[i]
+                n_valor[g] += 1
+            if not np.isnan(custo[i]):
+                soma_custo[g] += custo[i]
+                n_custo[g] += 1
+            if tem_venda_id[i]:
+                n_vendas[g] += 1
+        
+        media_margem = np.full(n_grupos, np.nan)
+        media_valor = np.full(n_grupos, np.nan)
+        media_custo = np.full(n_grupos, np.nan)
+        for g in range(n_grupos):
+            if n_margem[g] > 0:
+                media_margem[g] = soma_margem[g] / n_margem[g]
+            if n_valor[g] > 0:
+                media_valor[g] = soma_valor[g] / n_valor[g]
+            if n_custo[g] > 0:
+                media_custo[g] = soma_custo[g] / n_custo[g]
+        return soma_qtd, media_margem, media_valor, media_custo, n_vendas
+    
+    @njit(cache=True)
+    def _vendas_diarias_kernel(codigos, dia, quantidade, n_grupos, dia_inicial, n_dias_janela):
+        # Quantidade total e número de dias distintos com venda por SKU, numa
+        # passada e sem ordenar: uma grade SKU x dia marca os pares já vistos
+        total = np.zeros(n_grupos)
+        n_dias = np.zeros(n_grupos, dtype=np.int64)
+        visto = np.zeros(n_grupos * n_dias_janela, dtype=np.bool_)
+        for i in range(codigos.shape[0]):
+            g = codigos[i]
+            if not np.isnan(quantidade[i]):
+                total[g] += quantidade[i]
+            j = g * n_dias_janela + (dia[i] - dia_inicial)
+            if not visto[j]:
+                visto[j] = True
+                n_dias[g] += 1
+        return total, n_dias
+
+
+def _agregar_por_sku(df_vendas):
+    """
+    Soma da quantidade, médias de margem/valor/custo e contagem de vendas por
+    SKU (SKUs na ordem de aparição, sem ordenar as chaves).
+    
+    Com numba, as cinco agregações saem de uma única passada pelos dados.
+    """
+    if not NUMBA_AVAILABLE:
+        df_agregado = df_vendas.groupby('sku', observed=True, sort=False).agg({
+            'quantidade': 'sum',  # Soma da quantidade vendida
+            'margem_proporcional': 'mean',  # Média da margem proporcional
+            'valor_unitario': 'mean',  # Valor unitário médio
+            'custo_unitario': 'mean',  # Custo unitário médio
+            'venda_id': 'count'  # Número de vendas
+        }).reset_index()
+        df_agregado.columns = [
+            'sku',
+            'quantidade_vendida_total',
+            'margem_proporcional_media',
+            'valor_unitario_medio',
+            'custo_unitario_medio',
+            'num_vendas'
+        ]
+        return df_agregado
+    
+    # Com sku categórico a fatoração só reaproveita (e compacta) os códigos
+    codigos, skus = pd.factorize(df_vendas['sku'])
+    # Colunas já chegam em float32 (DTYPES_VENDAS): o kernel lê sem cópia e
+    # acumula em float64
+    colunas = [
+        df_vendas[c].to_numpy(dtype=np.float32, na_value=np.nan)
+        for c in ('quantidade', 'margem_proporcional', 'valor_unitario', 'custo_unitario')
+    ]
+    qtd, margem, valor, custo, n_vendas = _agregar_kernel(
+        codigos, *colunas, df_vendas['venda_id'].notna().to_numpy(), len(skus)
+    )
+    return pd.DataFrame({
+        'sku': skus,
+        'quantidade_vendida_total': qtd,
+        'margem_proporcional_media': margem,
+        'valor_unitario_medio': valor,
+        'custo_unitario_medio': custo,
+        'num_vendas': n_vendas,
+    })
+
+
+def _carregar_vendas(caminho_vendas="DB/venda_produtos_atual.csv"):
+    """
+    Carrega as colunas usadas de venda_produtos já tipadas (numéricos e
+    created_at como datetime), via cache Parquet ao lado do CSV.
+    """
+    df = _ler_csv_com_cache(caminho_vendas, DTYPES_VENDAS_VALIDACAO)
+    # sku categórico: a fatoração é feita uma vez e reaproveitada pelos groupbys
+    df['sku'] = df['sku'].astype('category')
+    return df
+
+
 def validar_estrutura_vendas():
     """Valida estrutura do arquivo venda_produtos"""
     print("=" * 80)
@@ -44,10 +175,17 @@ def validar_estrutura_vendas():
     return True
 
 
-def extrair_dados_vendas(caminho_vendas="DB/venda_produtos_atual.csv"):
+def extrair_dados_vendas(caminho_vendas="DB/venda_produtos_atual.csv", df_vendas=None):
     """
     Extrai dados agregados de venda_produtos por SKU.
     
+    Parameters:
+    -----------
+    caminho_vendas : str
+        CSV de venda_produtos (lido só se df_vendas não for informado)
+    df_vendas : pd.DataFrame, optional
+        Vendas já carregadas por _carregar_vendas (evita reler o arquivo)
+    
     Returns:
     --------
     pd.DataFrame
@@ -64,48 +202,22 @@ def extrair_dados_vendas(caminho_vendas="DB/venda_produtos_atual.csv"):
     print("EXTRAINDO: Dados agregados de venda_produtos")
     print("=" * 80)
     
-    print(f"\nLendo arquivo: {caminho_vendas}...")
-    df_vendas = pd.read_csv(caminho_vendas, low_memory=False)
+    if df_vendas is None:
+        print(f"\nLendo arquivo: {caminho_vendas}...")
+        # Colunas já chegam tipadas (datas e numéricos), sem to_datetime/to_numeric
+        df_vendas = _carregar_vendas(caminho_vendas)
     
     print(f"[OK] {len(df_vendas):,} registros carregados")
     
-    # Converte created_at para datetime
-    print("\nConvertendo datas...")
-    df_vendas['created_at'] = pd.to_datetime(df_vendas['created_at'], errors='coerce')
-    
     # Remove registros com SKU nulo
     print("Filtrando registros validos...")
     df_vendas = df_vendas[df_vendas['sku'].notna()]
     
-    # Converte margem_proporcional para numérico (pode ter valores vazios)
-    df_vendas['margem_proporcional'] = pd.to_numeric(df_vendas['margem_proporcional'], errors='coerce')
-    
-    # Converte valores para numérico
-    df_vendas['quantidade'] = pd.to_numeric(df_vendas['quantidade'], errors='coerce')
-    df_vendas['valor_unitario'] = pd.to_numeric(df_vendas['valor_unitario'], errors='coerce')
-    df_vendas['custo_unitario'] = pd.to_numeric(df_vendas['custo_unitario'], errors='coerce')
-    
     print(f"[OK] {len(df_vendas):,} registros validos apos filtros")
     
     # Agrega por SKU
     print("\nAgregando dados por SKU...")
-    df_agregado = df_vendas.groupby('sku').agg({
-        'quantidade': 'sum',  # Soma da quantidade vendida
-        'margem_proporcional': 'mean',  # Média da margem proporcional
-        'valor_unitario': 'mean',  # Valor unitário médio
-        'custo_unitario': 'mean',  # Custo unitário médio
-        'venda_id': 'count'  # Número de vendas
-    }).reset_index()
-    
-    # Renomeia colunas
-    df_agregado.columns = [
-        'sku',
-        'quantidade_vendida_total',
-        'margem_proporcional_media',
-        'valor_unitario_medio',
-        'custo_unitario_medio',
-        'num_vendas'
-    ]
+    df_agregado = _agregar_por_sku(df_vendas)
     
     # Calcula Rentabilidade: R(t) = Média (Valor de Venda Unitário - Custo de Aquisição Unitário)
     # Usamos os valores médios por SKU
@@ -136,16 +248,40 @@ def calcular_venda_media_diaria(df_vendas, periodo_dias=365):
     """
     print(f"\nCalculando venda media diaria (ultimos {periodo_dias} dias)...")
     
-    # Filtra período
-    data_limite = df_vendas['created_at'].max() - pd.Timedelta(days=periodo_dias)
-    df_periodo = df_vendas[df_vendas['created_at'] >= data_limite].copy()
-    
-    # Agrupa por SKU e data, soma quantidade
-    df_vendas_diarias = df_periodo.groupby(['sku', pd.Grouper(key='created_at', freq='D')])['quantidade'].sum().reset_index()
-    
-    # Calcula média diária por SKU
-    venda_media = df_vendas_diarias.groupby('sku')['quantidade'].mean().reset_index()
-    venda_media.columns = ['sku', 'venda_media_diaria']
+    # Filtra período com máscara aplicada direto nos arrays (sem copiar o DataFrame)
+    # Series.max() ignora NaT (o max do numpy propagaria NaT e zeraria a máscara)
+    created_at = df_vendas['created_at'].to_numpy()
+    data_limite = (df_vendas['created_at'].max() - pd.Timedelta(days=periodo_dias)).to_datetime64()
+    codigos, skus = pd.factorize(df_vendas['sku'])
+    mask = df_vendas['created_at'].notna().to_numpy() & (created_at >= data_limite) & (codigos >= 0)
+    
+    # Chaves inteiras: código do SKU e dia desde a época
+    codigos = codigos[mask]
+    dia = created_at[mask].astype('datetime64[D]').view('int64')
+    quantidade = df_vendas['quantidade'].to_numpy(dtype=np.float32, na_value=np.nan)[mask]
+    
+    # Média das somas diárias = quantidade total / número de dias com venda,
+    # sem montar a tabela intermediária (sku, dia)
+    if not mask.any():
+        # Janela sem vendas (ou sem datas válidas): resultado vazio, como no groupby
+        com_venda = np.array([], dtype=np.intp)
+        total, n_dias = np.array([]), np.array([], dtype=np.int64)
+    elif NUMBA_AVAILABLE:
+        # A janela tem no máximo periodo_dias + 1 dias distintos
+        dia_inicial = dia.min()
+        total, n_dias = _vendas_diarias_kernel(
+            codigos, dia, quantidade, len(skus), dia_inicial, dia.max() - dia_inicial + 1
+        )
+        com_venda = np.flatnonzero(n_dias)
+        total, n_dias = total[com_venda], n_dias[com_venda]
+    else:
+        gb_total = pd.Series(quantidade).groupby(codigos, sort=False).sum()
+        n_dias = pd.Series(dia).groupby(codigos, sort=False).nunique().to_numpy()
+        com_venda, total = gb_total.index.to_numpy(), gb_total.to_numpy()
+    venda_media = pd.DataFrame({
+        'sku': skus.take(com_venda),
+        'venda_media_diaria': total / n_dias,
+    })
     
     print(f"[OK] Venda media calculada para {len(venda_media):,} SKUs")
     
@@ -178,12 +314,12 @@ def calcular_nivel_urgencia(df_estoque_atual, df_venda_media_diaria):
     )
     
     # Calcula U(t) = Estoque Atual / Venda Média Diária
-    # Evita divisão por zero
-    df_merge['nivel_urgencia'] = np.where(
-        df_merge['venda_media_diaria'] > 0,
-        df_merge['saldo'] / df_merge['venda_media_diaria'],
-        np.inf  # Se não há vendas, urgência é infinita (estoque dura "para sempre")
-    )
+    # Divide só onde há vendas; no resto fica np.inf (estoque dura "para sempre")
+    saldo = df_merge['saldo'].to_numpy(dtype=np.float64, copy=False)
+    venda_media = df_merge['venda_media_diaria'].to_numpy(dtype=np.float64, copy=False)
+    nivel_urgencia = np.full(saldo.shape, np.inf)
+    np.divide(saldo, venda_media, out=nivel_urgencia, where=venda_media > 0)
+    df_merge['nivel_urgencia'] = nivel_urgencia
     
     print(f"[OK] Nivel de urgencia calculado para {len(df_merge):,} SKUs")
     
@@ -200,27 +336,34 @@ def validar_extracao_completa():
     if not validar_estrutura_vendas():
         return
     
-    # 2. Extrai dados de vendas
-    df_vendas_agregado = extrair_dados_vendas()
+    # 2. Extrai dados de vendas (arquivo lido uma única vez)
+    df_vendas = _carregar_vendas()
+    df_vendas = df_vendas[df_vendas['sku'].notna()]
+    df_vendas_agregado = extrair_dados_vendas(df_vendas=df_vendas)
     
     # 3. Calcula venda média diária
-    df_vendas_raw = pd.read_csv("DB/venda_produtos_atual.csv", low_memory=False)
-    df_vendas_raw['created_at'] = pd.to_datetime(df_vendas_raw['created_at'], errors='coerce')
-    df_vendas_raw['quantidade'] = pd.to_numeric(df_vendas_raw['quantidade'], errors='coerce')
-    df_vendas_raw = df_vendas_raw[df_vendas_raw['sku'].notna()]
-    
-    df_venda_media_diaria = calcular_venda_media_diaria(df_vendas_raw)
+    df_venda_media_diaria = calcular_venda_media_diaria(df_vendas)
     
     # 4. Tenta calcular nível de urgência (precisa do estoque atual)
     caminho_estoque = Path("DB/historico_estoque_atual.csv")
     if caminho_estoque.exists():
         print(f"\nLendo estoque atual de: {caminho_estoque}")
-        df_estoque = pd.read_csv(caminho_estoque)
-        df_estoque['created_at'] = pd.to_datetime(df_estoque['created_at'], errors='coerce')
+        # sku/saldo/created_at já tipados na leitura (datas ISO 8601, com ou sem fração).
+        # Leitura em streaming: de cada bloco fica só o último registro por SKU
+        df_estoque = _ler_csv_com_cache(
+            caminho_estoque, DTYPES_ESTOQUE, reduzir_bloco=_ultimo_registro_por_sku
+        )
+        # Mesmo dtype categórico das vendas: os merges por sku comparam códigos
+        # inteiros. SKUs sem venda não entram em nenhum merge e já saem aqui
+        dtype_sku = df_vendas['sku'].dtype
+        df_estoque = df_estoque[df_estoque['sku'].isin(dtype_sku.categories)]
+        df_estoque['sku'] = df_estoque['sku'].astype(dtype_sku)
         
-        # Pega último saldo por SKU (estoque atual)
-        df_estoque_atual = df_estoque.sort_values('created_at').groupby('sku').last().reset_index()[['sku', 'saldo']]
-        df_estoque_atual['saldo'] = pd.to_numeric(df_estoque_atual['saldo'], errors='coerce')
+        # Pega último saldo por SKU (estoque atual): idxmax da data, sem ordenar
+        # o histórico. Os grupos saem na ordem das categorias (SKUs em ordem
+        # crescente), o que só custa ordenar os códigos dos grupos
+        idx_ultimo = df_estoque.groupby('sku', observed=True)['created_at'].idxmax()
+        df_estoque_atual = df_estoque.loc[idx_ultimo, ['sku', 'saldo']].reset_index(drop=True)
         
         df_urgencia = calcular_nivel_urgencia(df_estoque_atual, df_venda_media_diaria)
     else:
@@ -261,6 +404,13 @@ def validar_extracao_completa():
         df_urgencia_ordenado = df_urgencia.nsmallest(10, 'nivel_urgencia')
         print(df_urgencia_ordenado.to_string(index=False))
     
+    # Médias gerais calculadas de uma vez (uma redução por bloco de colunas)
+    colunas_media = ['margem_proporcional_media', 'rentabilidade_media', 'venda_media_diaria']
+    if df_urgencia is not None:
+        colunas_media.append('nivel_urgencia')
+    medias = df_final[colunas_media].mean()
+    total_vendido = df_final['quantidade_vendida_total'].sum()
+    
     # Validações
     print("\n" + "=" * 80)
     print("VALIDACOES:")
@@ -268,24 +418,24 @@ def validar_extracao_completa():
     
     print(f"\n1. Quantidade vendida (soma):")
     print(f"   [OK] Coluna 'quantidade_vendida_total' presente")
-    print(f"   Total geral: {df_final['quantidade_vendida_total'].sum():,.0f} unidades")
+    print(f"   Total geral: {total_vendido:,.0f} unidades")
     
     print(f"\n2. Margem proporcional (media):")
     print(f"   [OK] Coluna 'margem_proporcional_media' presente")
-    print(f"   Media geral: {df_final['margem_proporcional_media'].mean():.2f}%")
+    print(f"   Media geral: {medias['margem_proporcional_media']:.2f}%")
     
     print(f"\n3. Rentabilidade R(t) = Media (Valor Unitario - Custo Unitario):")
     print(f"   [OK] Coluna 'rentabilidade_media' calculada")
-    print(f"   Media geral: R$ {df_final['rentabilidade_media'].mean():.2f}")
+    print(f"   Media geral: R$ {medias['rentabilidade_media']:.2f}")
     
     print(f"\n4. Venda media diaria historica:")
     print(f"   [OK] Coluna 'venda_media_diaria' calculada")
-    print(f"   Media geral: {df_final['venda_media_diaria'].mean():.2f} unidades/dia")
+    print(f"   Media geral: {medias['venda_media_diaria']:.2f} unidades/dia")
     
     if df_urgencia is not None:
         print(f"\n5. Nivel de Urgencia U(t) = Estoque Atual / Venda Media Diaria:")
         print(f"   [OK] Coluna 'nivel_urgencia' calculada")
-        print(f"   Media geral: {df_final['nivel_urgencia'].mean():.1f} dias")
+        print(f"   Media geral: {medias['nivel_urgencia']:.1f} dias")
     
     print("\n" + "=" * 80)
     print("[OK] Validacao concluida! Sistema consegue extrair todas as metricas.")